@@ -0,0 +1,304 @@
+""" Column Aggregates
+
+This script reduces a numeric column to a small, fixed size
+summary that can be plotted in place of the raw values. This
+includes binned counts for histograms, quantile summaries for
+boxplots, and kernel density estimates for density plots.
+Moments of parts of a column can be merged, so columns too
+large for memory can be summarised a part at a time.
+
+To achieve this functionality, simply run histogram(),
+box_summary() or kde() by providing them with a column.
+
+This script requires that numpy be installed within the Python
+environment you are running this script on.
+"""
+
+
+# Importing libraries
+import numpy as np
+
+
+def finite_values(values):
+    """
+    Helper function
+
+    finite_values converts a column to a float array and
+    removes missing and infinite values.
+
+    :param values: array-like of numbers
+    :returns: numpy array of finite floats
+    """
+
+    values = np.asarray(values, dtype=float)
+    return values[np.isfinite(values)]
+
+
+def histogram(values, bins=20):
+    """
+    histogram counts the values of a column falling in
+    equally sized bins.
+
+    :param values: array-like of numbers
+    :param bins: integer representing number of bins
+    :returns: tuple of bin edges and counts
+    """
+
+    values = finite_values(values)
+    if len(values) == 0:
+        return np.array([0., 1.]), np.array([0])
+
+    counts, edges = np.histogram(values, bins=bins)
+    return edges, counts
+
+
+def box_summary(values, max_outliers=500):
+    """
+    box_summary computes the quartiles, whiskers and outliers
+    drawn by a boxplot. Whiskers reach the most extreme values
+    within 1.5 times the interquartile range of the box.
+
+    :param values: array-like of numbers
+    :param max_outliers: integer representing most outliers kept
+    :returns: dictionary of summary statistics, None if no values
+    """
+
+    values = finite_values(values)
+    if len(values) == 0:
+        return None
+
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5*iqr) & (values <= q3 + 1.5*iqr)]
+    outliers = np.sort(values[(values < q1 - 1.5*iqr) | (values > q3 + 1.5*iqr)])
+
+    # Keeps an evenly spaced sample of outliers, including both extremes
+    if len(outliers) > max_outliers:
+        keep = np.linspace(0, len(outliers)-1, max_outliers).round().astype(int)
+        outliers = outliers[keep]
+
+    return {'q1': q1, 'median': median, 'q3': q3,
+            'lower': inside.min(), 'upper': inside.max(),
+            'outliers': outliers, 'count': len(values)}
+
+
+def bandwidth(values):
+    """
+    Helper function for kde
+
+    bandwidth chooses a gaussian kernel bandwidth using
+    Scott's rule.
+
+    :param values: numpy array of finite floats
+    :returns: float representing bandwidth
+    """
+
+    std = values.std(ddof=1) if len(values) > 1 else 0.
+    if std > 0:
+        return std * len(values) ** (-1/5)
+
+    # Constant columns still produce a visible peak
+    return max(abs(values[0]) * 1e-3, 1e-3) if len(values) else 1.
+
+
+def min_width(low, high, grid_size):
+    """
+    Helper function for kde
+
+    min_width finds the bandwidth equal to the spacing of a grid
+    reaching 3 bandwidths past both ends of a range of values.
+
+    :param low: float representing smallest value
+    :param high: float representing largest value
+    :param grid_size: integer representing number of grid points
+    :returns: float representing bandwidth
+    """
+
+    return (high - low) / max(grid_size - 7, 1)
+
+
+def linear_bin(values, low, delta, grid_size):
+    """
+    Helper function for kde
+
+    linear_bin spreads each value between its two nearest
+    grid points in proportion to its distance from them.
+
+    :param values: numpy array of finite floats
+    :param low: float representing first grid point
+    :param delta: float representing grid spacing
+    :param grid_size: integer representing number of grid points
+    :returns: numpy array of weights per grid point
+    """
+
+    position = np.clip((values - low) / delta, 0, grid_size - 1)
+    left = np.minimum(np.floor(position).astype(int), grid_size - 2)
+    fraction = position - left
+
+    weights = np.bincount(left, 1 - fraction, minlength=grid_size)
+    weights += np.bincount(left + 1, fraction, minlength=grid_size)
+    return weights[:grid_size]
+
+
+def smooth(weights, width, delta):
+    """
+    Helper function for kde
+
+    smooth convolves binned weights with a gaussian kernel
+    using the fast fourier transform. Works on a single row
+    of weights or on one row per group.
+
+    :param weights: numpy array of weights, last axis is the grid
+    :param width: float or array of floats representing bandwidths
+    :param delta: float representing grid spacing
+    :returns: numpy array of smoothed weights, same shape as weights
+    """
+
+    grid_size = weights.shape[-1]
+    width = np.asarray(width, dtype=float).reshape(-1, 1)
+
+    # Kernel is truncated at 4 bandwidths or the grid size
+    reach = int(min(grid_size - 1, np.ceil(4 * width.max() / delta)))
+    offsets = np.arange(-reach, reach + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / width) ** 2)
+
+    # Scales the sampled kernel to unit area, as bandwidths narrower
+    # than the grid spacing leave too few samples to integrate to one
+    kernel = kernel / (kernel.sum(axis=-1, keepdims=True) * delta)
+
+    # Zero pads to avoid wrap around of the circular convolution
+    n_fft = 1 << int(np.ceil(np.log2(grid_size + 2*reach + 1)))
+    product = np.fft.rfft(weights, n_fft) * np.fft.rfft(kernel, n_fft)
+    convolved = np.fft.irfft(product, n_fft)[..., reach:reach + grid_size]
+
+    return convolved.reshape(weights.shape)
+
+
+def kde(values, grid_size=512):
+    """
+    kde estimates the density of a column with a gaussian
+    kernel. Values are binned onto an evenly spaced grid and
+    the kernel is applied with an FFT, so the cost of drawing
+    the curve does not depend on the number of values.
+
+    :param values: array-like of numbers
+    :param grid_size: integer representing number of grid points
+    :returns: tuple of grid points and density at each point
+    """
+
+    values = finite_values(values)
+    if len(values) == 0:
+        return np.array([]), np.array([])
+
+    # Bandwidth is kept at least one grid spacing wide so heavy
+    # tailed columns give a smooth curve rather than single spikes
+    width = max(bandwidth(values), min_width(values.min(), values.max(), grid_size))
+    grid = np.linspace(values.min() - 3*width, values.max() + 3*width, grid_size)
+    delta = grid[1] - grid[0]
+
+    weights = linear_bin(values, grid[0], delta, grid_size)
+    density = smooth(weights, width, delta) / len(values)
+
+    return grid, np.maximum(density, 0)
+
+
+def grouped_kde(values, codes, n_groups, grid_size=512):
+    """
+    grouped_kde estimates the density of a column within every
+    group in a single pass. All groups share one grid so their
+    curves can be compared directly, and each group gets its
+    own bandwidth.
+
+    :param values: array-like of numbers
+    :param codes: array of integer group numbers, negative for no group
+    :param n_groups: integer representing number of groups
+    :param grid_size: integer representing number of grid points
+    :returns: tuple of grid points, densities with one row per group, 
+              and number of values per group
+    """
+
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes)
+    keep = np.isfinite(values) & (codes >= 0)
+    values, codes = values[keep], codes[keep]
+
+    if len(values) == 0:
+        return np.array([]), np.zeros((n_groups, 0)), np.zeros(n_groups, dtype=int)
+
+    # Group sizes, means and standard deviations from running sums,
+    # taken around the overall mean to limit rounding error
+    centre = values.mean()
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, values - centre, minlength=n_groups)
+    squares = np.bincount(codes, (values - centre) ** 2, minlength=n_groups)
+    safe = np.maximum(counts, 1)
+    means = sums / safe
+    variance = (squares - safe * means ** 2) / np.maximum(counts - 1, 1)
+    std = np.sqrt(np.maximum(variance, 0))
+
+    # Scott's rule per group. The grid reaches 3 of the widest
+    # bandwidths past the values, with a small reach if every group
+    # holds the same single value
+    widths = std * safe ** (-1/5)
+    spread = max(widths.max(), min_width(values.min(), values.max(), grid_size))
+    if spread == 0:
+        spread = max(abs(centre) * 1e-3, 1e-3)
+
+    grid = np.linspace(values.min() - 3*spread, values.max() + 3*spread, grid_size)
+    delta = grid[1] - grid[0]
+
+    # Narrow and constant groups are kept one grid spacing wide
+    widths = np.maximum(widths, delta)
+
+    # Bins every group at once by offsetting each group's grid
+    position = np.clip((values - grid[0]) / delta, 0, grid_size - 1)
+    left = np.minimum(np.floor(position).astype(int), grid_size - 2)
+    fraction = position - left
+    cells = codes * grid_size + left
+    weights = np.bincount(cells, 1 - fraction, minlength=n_groups * grid_size)
+    weights += np.bincount(cells + 1, fraction, minlength=n_groups * grid_size)
+    weights = weights.reshape(n_groups, grid_size)
+
+    densities = smooth(weights, widths, delta) / safe[:, None]
+
+    return grid, np.maximum(densities, 0), counts
+
+
+def moments(values):
+    """
+    moments computes the count, mean, sum of squared deviations
+    from the mean, minimum and maximum of a column. Moments of
+    separate parts of a column can be combined with merge_moments,
+    so a column can be summarised a part at a time.
+
+    :param values: array-like of numbers
+    :returns: tuple of count, mean, squared deviations, minimum and maximum
+    """
+
+    values = finite_values(values)
+    if len(values) == 0:
+        return 0, 0., 0., np.inf, -np.inf
+
+    mean = values.mean()
+    return len(values), mean, ((values - mean) ** 2).sum(), values.min(), values.max()
+
+
+def merge_moments(first, second):
+    """
+    merge_moments combines the moments of two parts of a column
+    into the moments of both parts together.
+
+    :param first: tuple produced by moments
+    :param second: tuple produced by moments
+    :returns: tuple of count, mean, squared deviations, minimum and maximum
+    """
+
+    count = first[0] + second[0]
+    if count == 0:
+        return first
+
+    delta = second[1] - first[1]
+    mean = first[1] + delta * second[0] / count
+    squares = first[2] + second[2] + delta ** 2 * first[0] * second[0] / count
+
+    return count, mean, squares, min(first[3], second[3]), max(first[4], second[4])
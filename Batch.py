@@ -0,0 +1,295 @@
+""" Batch Wrangler
+
+This script runs the wrangling pipeline of the notebook without
+widgets, so that many files can be processed at once. Each file
+is read, its header rows combined, rows and columns dropped, a
+location column optionally geocoded, and the cleaned data set
+saved along with a profile of its columns. Files are spread
+across a pool of processes and a summary report with the time
+spent on each step is written once all files are done.
+
+To achieve this functionality, run this script from the command
+line, for example:
+
+    python Batch.py data/*.csv --output cleaned --headers 2 --drop-columns Notes
+
+Directories are searched along with their subdirectories, so
+python Batch.py drops processes every file below drops.
+
+Run python Batch.py --help for every option.
+
+This script requires that pandas be installed within the Python
+environment you are running this script on, as well as panel and
+requests if geocoding.
+"""
+
+
+# Importing libraries
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# Importing other scripts
+import Frames as fr
+
+
+def process_file(path, options):
+    """
+    process_file runs the pipeline on a single file.
+
+    :param path: string representing file path
+    :param options: dictionary of pipeline options
+    :returns: dictionary summarising the run, including seconds per step
+    """
+
+    summary = {'file': path, 'status': 'ok', 'rows': None, 'columns': None}
+    start = time.perf_counter()
+
+    def lap(step):
+        """
+        Helper function
+
+        lap records the seconds spent on a step since the last lap.
+        """
+
+        nonlocal start
+        now = time.perf_counter()
+        summary[step + '_s'] = round(now - start, 4)
+        start = now
+
+    try:
+        data = fr.read_file(path)
+        if data is None:
+            summary['status'] = 'unsupported file type'
+            return summary
+        lap('load')
+
+        # Applies header and drop settings
+        data = fr.combine_headers(data, options['headers'])
+        for lower, upper in options['drop_rows']:
+            data = fr.drop_range(data, lower, upper)
+        data = data.drop([col for col in options['drop_columns'] if col in data.columns], axis=1)
+        data = data.reset_index(drop=True)
+        lap('edit')
+
+        # Geocodes location column
+        if options['geocode'] is not None:
+            # Imported only when needed, as it loads requests
+            import GeoTools as gt
+            if options['geocode'] not in data.columns:
+                raise KeyError('No column named ' + options['geocode'])
+            address_dict = gt.geocode_column(data[options['geocode']])
+            gt.add_coordinates(data, options['geocode'], address_dict)
+            lap('geocode')
+
+        profile = profile_columns(data)
+        lap('profile')
+
+        # Saves cleaned data set and profile
+        name = output_name(path, options['root'], options['output'])
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        data.to_csv(name + '_clean.csv', index=False)
+        profile.to_csv(name + '_profile.csv', index=False)
+        lap('write')
+
+        summary['rows'], summary['columns'] = data.shape
+
+    except Exception as error:
+        summary['status'] = 'error: ' + str(error)
+
+    return summary
+
+
+def profile_columns(data):
+    """
+    profile_columns summarises every column of a data frame,
+    including the statistics shown by explore_data.
+
+    :param data: data frame
+    :returns: data frame with one row per column
+    """
+
+    rows = []
+    for column in data.columns:
+        values = data[column]
+        row = {'column': column, 'dtype': str(values.dtype),
+               'count': int(values.count()), 'missing': int(values.isnull().sum()),
+               'unique': int(values.nunique())}
+
+        # Quantitative columns get the statistics of describe()
+        if values.dtype != 'O':
+            stats = values.describe()
+            for stat in ['mean', 'std', 'min', '25%', '50%', '75%', 'max']:
+                row[stat] = stats.get(stat)
+        else:
+            counts = values.value_counts()
+            if len(counts) > 0:
+                row['top'], row['freq'] = counts.index[0], int(counts.iloc[0])
+
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def find_files(paths):
+    """
+    Helper function
+
+    find_files expands wildcards and searches directories, including
+    their subdirectories, for the csv, tsv and txt files they contain.
+
+    :param paths: list of file paths, directories or wildcards
+    :returns: sorted list of file paths
+    """
+
+    files = set()
+    for path in paths:
+        for match in glob.glob(path) or [path]:
+            if os.path.isdir(match):
+                files.update(os.path.join(folder, name)
+                             for folder, _, names in os.walk(match) for name in names)
+            else:
+                files.add(match)
+
+    return sorted(name for name in files if name.endswith(('.csv', '.tsv', '.txt')))
+
+
+def output_name(path, root, output):
+    """
+    Helper function
+
+    output_name places a file's outputs in the output directory
+    at the file's path relative to the common root of the inputs,
+    so files with the same name in different folders are kept
+    apart.
+
+    :param path: string representing file path
+    :param root: string representing directory holding every input
+    :param output: string representing output directory
+    :returns: string representing output path without suffix or extension
+    """
+
+    relative = os.path.relpath(os.path.abspath(path), root)
+    return os.path.join(output, os.path.splitext(relative)[0])
+
+
+def parse_rows(text):
+    """
+    Helper function
+
+    parse_rows reads row numbers and ranges in the format of
+    the notebook's row drop widget, separated by commas.
+
+    :param text: string such as '3,10-15'
+    :returns: list of (lower, upper) tuples
+    """
+
+    ranges = []
+    for part in filter(None, text.split(',')):
+        bounds = part.split('-')
+        try:
+            if len(bounds) > 2:
+                raise ValueError
+            ranges.append((int(bounds[0]), int(bounds[-1])))
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                "invalid row or range '{}', expected a number or two numbers "
+                "separated by '-'".format(part))
+
+    return ranges
+
+
+def run(files, options, workers=None):
+    """
+    run processes files in a pool of processes and prints each
+    file's result as it finishes.
+
+    :param files: list of file paths
+    :param options: dictionary of pipeline options
+    :param workers: integer representing number of processes, one per CPU if None
+    :returns: data frame summarising every file
+    """
+
+    os.makedirs(options['output'], exist_ok=True)
+    start = time.perf_counter()
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_file, path, options) for path in files]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            print('[{}/{}] {} ({})'.format(len(summaries), len(files),
+                                           summary['file'], summary['status']))
+
+    report = pd.DataFrame(summaries).sort_values('file').reset_index(drop=True)
+    steps = [col for col in report.columns if col.endswith('_s')]
+    report['total_s'] = report[steps].sum(axis=1).round(4)
+
+    print('\nProcessed {} files in {:.2f}s, {} failed'.format(
+        len(report), time.perf_counter() - start, int((report['status'] != 'ok').sum())))
+    print(report[steps + ['total_s']].agg(['sum', 'mean', 'max']).round(4).to_string())
+
+    return report
+
+
+def main(argv=None):
+    """
+    Main function
+
+    main reads command line arguments and runs the pipeline.
+
+    :param argv: list of command line arguments, sys.argv if None
+    :returns: integer exit code
+    """
+
+    parser = argparse.ArgumentParser(description='Clean, geocode and profile many data files.')
+    parser.add_argument('paths', nargs='+', help='files, directories or wildcards to process')
+    parser.add_argument('--output', default='cleaned', help='directory for output files')
+    parser.add_argument('--headers', type=int, default=1, help='number of header rows')
+    parser.add_argument('--drop-columns', default='', help='comma separated columns to drop')
+    parser.add_argument('--drop-rows', type=parse_rows, default='', 
+                        help='comma separated rows/ranges (e.g. 1-5)')
+    parser.add_argument('--geocode', default=None, help='column to geocode')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--report', default=None, help='summary report path')
+    args = parser.parse_args(argv)
+
+    # Outputs of earlier runs are not processed again
+    output = os.path.abspath(args.output)
+    files = [path for path in find_files(args.paths) 
+             if os.path.commonpath([output, os.path.abspath(path)]) != output]
+    if len(files) == 0:
+        print('No csv, tsv or txt files found.')
+        return 1
+
+    # Outputs are named by path from the folder holding every input,
+    # and inputs differing only by extension would overwrite each other
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    names = {}
+    for path in files:
+        names.setdefault(output_name(path, root, args.output), []).append(path)
+    clashes = [paths for paths in names.values() if len(paths) > 1]
+    if len(clashes) > 0:
+        parser.error('files would overwrite each other\'s outputs: ' + 
+                     '; '.join(', '.join(paths) for paths in clashes))
+
+    options = {'output': args.output, 'root': root, 'headers': args.headers,
+               'drop_columns': [col for col in args.drop_columns.split(',') if col],
+               'drop_rows': args.drop_rows, 'geocode': args.geocode}
+
+    report = run(files, options, args.workers)
+    report_path = args.report or os.path.join(args.output, 'summary.csv')
+    report.to_csv(report_path, index=False)
+    print('\nSummary report saved to ' + report_path)
+
+    return int((report['status'] != 'ok').any())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
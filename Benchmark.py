@@ -0,0 +1,469 @@
+""" Benchmarks
+
+This script measures how the notebook's data operations scale
+with the size of the data set. Synthetic tables shaped like the
+sample data set (numeric, text and latitude/longitude columns)
+are generated at the requested sizes, and the time and peak
+memory of loading, modifying, exploring, visualizing and
+geocoding them are recorded. Geocoding is measured against a
+local stub server instead of the real API.
+
+The time taken to import each script is measured too, in a
+fresh interpreter each time.
+
+Results are saved as JSON so that runs of different versions
+can be compared, for example:
+
+    python Benchmark.py --sizes 1000 100000 --output before.json
+    python Benchmark.py --sizes 1000 100000 --compare before.json
+
+This script requires that numpy, pandas, panel, holoviews,
+hvplot, datashader and requests be installed within the Python
+environment you are running this script on.
+"""
+
+
+# Importing libraries
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pandas as pd
+
+# Importing other scripts
+import Frames as fr
+import Chunks as ch
+import GeoTools as gt
+import HoloV as ho
+import Indexes as ix
+import Sessions as sn
+
+
+# Regions used for the grouped columns of synthetic tables
+regions = ['Northern America', 'South America', 'Western Europe', 'Eastern Europe',
+           'Northern Africa', 'Western Africa', 'Middle East', 'Central Asia',
+           'Eastern Asia', 'South-Eastern Asia', 'Southern Asia', 'Oceania']
+
+
+def make_dataset(rows, seed=0):
+    """
+    make_dataset generates a synthetic table shaped like the
+    sample data set, with a unique text identifier, a text
+    location column of up to 250 values, a region column,
+    numeric columns with some missing values, and latitude
+    and longitude columns.
+
+    :param rows: integer representing number of rows
+    :param seed: integer representing random seed
+    :returns: data frame
+    """
+
+    random = np.random.RandomState(seed)
+    countries = min(rows, 250)
+
+    budget = random.lognormal(8, 2, rows)
+    budget[random.rand(rows) < 0.01] = np.nan
+
+    return pd.DataFrame({
+        'Rank': np.arange(1, rows + 1),
+        'ID': 'ID' + pd.Series(np.arange(rows)).astype(str),
+        'Country': 'Country ' + pd.Series(random.randint(0, countries, rows)).astype(str),
+        'Region': np.array(regions, dtype=object)[random.randint(0, len(regions), rows)],
+        'Total Population': random.lognormal(16, 2, rows).astype(np.int64),
+        'Active Personnel': random.lognormal(10, 1.5, rows).astype(np.int64),
+        'Defense Budget': budget,
+        'Coastline (km)': random.exponential(5000, rows),
+        'Latitude': random.uniform(-60, 70, rows),
+        'Longitude': random.uniform(-180, 180, rows)})
+
+
+def measure(func, *args, repeat=3):
+    """
+    measure times a function and records its peak memory.
+    The fastest of several runs is kept, and memory is traced
+    in a separate run so tracing does not slow the timings.
+
+    :param func: function to measure
+    :param args: arguments for func
+    :param repeat: integer representing number of timed runs
+    :returns: tuple of fastest seconds and peak bytes allocated
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return min(seconds), peak
+
+
+def measure_import(statement, repeat=3):
+    """
+    measure_import times import statements in fresh interpreters,
+    so that modules loaded by earlier benchmarks are not reused.
+    As with measure, memory is traced in a separate run.
+
+    :param statement: string representing Python statements to run
+    :param repeat: integer representing number of timed runs
+    :returns: tuple of fastest seconds and peak bytes allocated
+    """
+
+    timed = ('import time; start = time.perf_counter(); {}; '
+             'print(time.perf_counter() - start)')
+    traced = ('import tracemalloc; tracemalloc.start(); {}; '
+              'print(tracemalloc.get_traced_memory()[1])')
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def execute(code):
+        return float(subprocess.check_output([sys.executable, '-c', code.format(statement)],
+                                             cwd=directory).split()[-1])
+
+    seconds = [execute(timed) for _ in range(repeat)]
+
+    return min(seconds), int(execute(traced))
+
+
+class StubGeocoder(BaseHTTPRequestHandler):
+    """
+    StubGeocoder answers geocoding requests in the format of
+    the data science toolkit API with made up coordinates.
+    """
+
+    def do_GET(self):
+        body = json.dumps({'status': 'OK', 'results': [
+            {'geometry': {'location': {'lat': 32.88, 'lng': -117.23}}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server():
+    """
+    Helper function
+
+    start_stub_server runs the stub geocoder on a free local
+    port in a background thread.
+
+    :returns: HTTPServer
+    """
+
+    server = HTTPServer(('127.0.0.1', 0), StubGeocoder)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
+
+
+def benchmarks(data, path, only=None):
+    """
+    benchmarks lists the operations measured on a data set.
+    Plots are built with empty plot caches and without the indexes,
+    projections and densities shared between sessions, so that
+    construction is measured every time.
+
+    :param data: data frame
+    :param path: string representing path of data frame saved as csv
+    :param only: string, only benchmarks whose name starts with it are listed
+    :returns: list of (name, function) tuples
+    """
+
+    median = data['Total Population'].median()
+    directory = os.path.dirname(path)
+    chunks = []
+
+    def chunked():
+        # Stored only if a chunked benchmark runs, as storing is slow
+        if len(chunks) == 0:
+            chunks.append(ch.store_file(path, os.path.join(directory, 'chunks')))
+        return chunks[0]
+
+    def undo(edits):
+        # Drops rows, then undoes the drop as modify_data does, by
+        # going back to the earlier edits and showing them
+        previous, edits = edits, edits.drop_rows(10, len(data) // 2)
+        edits = previous
+        return edits.page(0, 0)
+
+    def plot(*selections):
+        ho.data_changed()
+        sn.discard_derived(ho.get_state().df)
+        return ho.build_plot(*selections)
+
+    def geocode():
+        address_dict = gt.geocode_column(data['Country'])
+        gt.add_coordinates(data[['Country']].copy(), 'Country', address_dict)
+
+    listed = [
+        ('load/read_file', lambda: fr.read_file(path)),
+        ('load/store_chunks', lambda: ch.store_file(path, os.path.join(directory, 'stored'))),
+        ('modify/edits_header', lambda: fr.Edits(data).with_head(2).page(0, 0)),
+        ('modify/edits_drop_column', lambda: fr.Edits(data).drop_column('Region').page(0, 0)),
+        ('modify/edits_drop_rows',
+         lambda: fr.Edits(data).drop_rows(10, len(data) // 2).page(0, 0)),
+        ('modify/edits_undo', lambda: undo(fr.Edits(data).drop_column('Region'))),
+        ('modify/edits_save', lambda: fr.Edits(data).drop_rows(10, len(data) // 2).frame()),
+        ('explore/filter_quantitative',
+         lambda: explore(data, data, 'Total Population', 'greater than', 'None', median,
+                         'Defense Budget')),
+        ('explore/filter_qualitative',
+         lambda: explore(data, data, 'Region', 'equal to', regions[0], 0, 'Defense Budget')),
+        ('explore/describe',
+         lambda: explore(data, data, 'Entire table', 'None', 'None', 0, 'Total Population')),
+        ('explore/chunked_filter',
+         lambda: explore(data, chunked(), 'Total Population', 'greater than', 'None', median,
+                         'Defense Budget')),
+        ('explore/chunked_describe',
+         lambda: explore(data, chunked(), 'Entire table', 'None', 'None', 0, 
+                         'Total Population')),
+        ('explore/value_index', lambda: ix.value_index(data['ID'])),
+        ('visualize/scatter',
+         lambda: plot('scatter', 'Total Population', 'Defense Budget', 'Country', 6,
+                      None, None, None)),
+        ('visualize/histogram',
+         lambda: plot('histogram', 'Defense Budget', None, None, None, None, None, None)),
+        ('visualize/boxplot',
+         lambda: plot('boxplot', 'Defense Budget', None, None, None, None, None, None)),
+        ('visualize/density',
+         lambda: plot('density', 'Defense Budget', None, None, None, 'None', 'None', None)),
+        ('visualize/density_grouped',
+         lambda: plot('density', 'Defense Budget', None, None, None, 'Region', None, 'Overlay')),
+        ('visualize/map',
+         lambda: plot('map', None, None, 'Country', 6, None, None, None)),
+        ('geocode/geocode_column', geocode)]
+
+    listed = [(name, func) for name, func in listed
+              if only is None or name.startswith(only)]
+
+    # Chunks are stored and checked before timing starts
+    if any(name.startswith('explore/chunked') for name, func in listed):
+        check_chunked(data, chunked())
+
+    return listed
+
+
+def explore(data, frame, *selections):
+    """
+    Helper function for benchmarks
+
+    explore filters and describes a data set through the same
+    path as explore_data, then selects the data frame again.
+
+    :param data: data frame selected in HoloV
+    :param frame: data frame or ChunkedFrame to explore
+    :param selections: arguments for HoloV.filter_info
+    :returns: tuple returned by HoloV.filter_info
+    """
+
+    if frame is data:
+        return ho.filter_info(*selections)
+
+    ho.df = frame
+    ho.find_types()
+    try:
+        return ho.filter_info(*selections)
+    finally:
+        ho.df = data
+        ho.find_types()
+
+
+def check_chunked(data, frame):
+    """
+    Helper function for benchmarks
+
+    check_chunked checks that filters on a chunked data set match
+    the same rows and statistics as on the data frame, so that
+    chunked benchmarks do not time wrong answers.
+
+    :param data: data frame selected in HoloV
+    :param frame: ChunkedFrame storing data
+    :raises AssertionError: if a filter gives a different result
+    """
+
+    median = data['Total Population'].median()
+    country = data['Country'].iloc[0]
+    filters = [('Region', 'equal to', regions[0], 0, 'Defense Budget'),
+               ('Region', 'not equal to', regions[0], 0, 'Country'),
+               ('Country', 'equal to', country, 0, 'Region'),
+               ('Total Population', 'greater than', 'None', median, 'Defense Budget')]
+
+    for selections in filters:
+        expected, expected_info, expected_count = explore(data, data, *selections)
+        shown, info, count = explore(data, frame, *selections)
+        same_rows = expected.index()[:len(shown)].equals(shown.index)
+        # Most frequent values tied in count may be reported in any order
+        statistics = [stat for stat in expected_info.columns if stat != 'top']
+        same_info = np.allclose(expected_info[statistics].values.astype(float),
+                                info[statistics].values.astype(float), equal_nan=True)
+        assert (count == expected_count) and same_rows and same_info, \
+            'Chunked filter {} does not match the data frame'.format(selections[:3])
+
+
+# Import statements measured, as scripts load their dependencies
+# on import and plotting libraries only on first use
+imports = [
+    ('import/Frames', 'import Frames'),
+    ('import/FileScript', 'import FileScript'),
+    ('import/HoloV', 'import HoloV'),
+    ('import/GeoTools', 'import GeoTools'),
+    ('import/plotting', 'import HoloV; HoloV.load_plotting()')]
+
+
+def run(sizes, repeat=3, only=None):
+    """
+    run measures every benchmark at every size.
+
+    :param sizes: list of integers representing numbers of rows
+    :param repeat: integer representing number of timed runs
+    :param only: string, only benchmarks whose name starts with it are run
+    :returns: list of result dictionaries
+    """
+
+    results = []
+
+    # Import times do not depend on the data, so are recorded with 0 rows
+    for name, statement in imports:
+        if only is not None and not name.startswith(only):
+            continue
+        seconds, peak = measure_import(statement, repeat=repeat)
+        results.append({'benchmark': name, 'rows': 0, 'seconds': seconds,
+                        'peak_mb': peak / 2**20})
+        print('{:<30} {:>10} rows {:>10.4f}s {:>10.1f}MB'.format(name, 0, seconds, peak / 2**20))
+
+    server = start_stub_server()
+    gt.geocode_url = 'http://127.0.0.1:{}/geocode?address='.format(server.server_port)
+
+    try:
+        for size in sizes:
+            data = make_dataset(size)
+            ho.df = data
+            ho.find_types()
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'synthetic.csv')
+                data.to_csv(path, index=False)
+
+                for name, func in benchmarks(data, path, only):
+                    seconds, peak = measure(func, repeat=repeat)
+                    results.append({'benchmark': name, 'rows': size, 'seconds': seconds,
+                                    'peak_mb': peak / 2**20})
+                    print('{:<30} {:>10} rows {:>10.4f}s {:>10.1f}MB'.format(
+                        name, size, seconds, peak / 2**20))
+    finally:
+        server.shutdown()
+
+    return results
+
+
+def environment():
+    """
+    Helper function
+
+    environment describes the machine and versions a run was
+    made with.
+
+    :returns: dictionary of run metadata
+    """
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    import holoviews
+    import panel
+
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': np.__version__, 'pandas': pd.__version__,
+            'panel': panel.__version__, 'holoviews': holoviews.__version__}
+
+
+def compare(results, baseline, threshold=1.25):
+    """
+    compare prints how each result changed from a baseline run
+    and flags those that slowed down past a threshold.
+
+    :param results: list of result dictionaries
+    :param baseline: list of result dictionaries from an earlier run
+    :param threshold: float representing slowdown ratio counted as a regression
+    :returns: list of (benchmark, rows, ratio) tuples for regressions
+    """
+
+    before = {(result['benchmark'], result['rows']): result for result in baseline}
+    regressions = []
+
+    print('\n{:<30} {:>10} {:>10} {:>10}'.format('benchmark', 'rows', 'time', 'memory'))
+    for result in results:
+        key = (result['benchmark'], result['rows'])
+        if key not in before:
+            continue
+        ratio = result['seconds'] / max(before[key]['seconds'], 1e-9)
+        memory = result['peak_mb'] / max(before[key]['peak_mb'], 1e-9)
+        flag = ' <- slower' if ratio > threshold else ''
+        print('{:<30} {:>10} {:>9.2f}x {:>9.2f}x{}'.format(key[0], key[1], ratio, memory, flag))
+        if ratio > threshold:
+            regressions.append((key[0], key[1], ratio))
+
+    return regressions
+
+
+def main(argv=None):
+    """
+    Main function
+
+    main reads command line arguments, runs the benchmarks and
+    saves their results.
+
+    :param argv: list of command line arguments, sys.argv if None
+    :returns: integer exit code, 1 if regressions were found
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the data operations.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of rows, e.g. 1000 10000000')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark')
+    parser.add_argument('--only', default=None, help='run benchmarks starting with this name')
+    parser.add_argument('--output', default='benchmark_results.json', help='results path')
+    parser.add_argument('--compare', default=None, help='results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.only)
+    with open(args.output, 'w') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=2)
+    print('\nResults saved to ' + args.output)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        return int(len(compare(results, baseline, args.threshold)) > 0)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
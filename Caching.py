@@ -0,0 +1,172 @@
+""" Result Caching
+
+This script provides a least recently used cache that keeps
+expensive results, such as plots, until a memory budget is
+exceeded. Hits, misses and evictions are counted so the cache
+can be tuned.
+
+To achieve this functionality, create an LRUCache and use its
+get() and put() methods.
+
+This script requires that numpy and pandas be installed within
+the Python environment you are running this script on.
+"""
+
+
+# Importing libraries
+import sys
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class LRUCache(object):
+    """
+    LRUCache stores values by key and evicts the least recently
+    used values once the total estimated size exceeds max_bytes.
+
+    :param max_bytes: integer representing memory budget in bytes
+    :param max_items: integer representing most values kept, None for no limit
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, max_items=None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        """
+        get returns the value stored under key and marks
+        it as most recently used.
+
+        :param key: hashable key
+        :param default: value returned when key is missing
+        :returns: stored value or default
+        """
+
+        if key not in self.items:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value, size=None):
+        """
+        put stores a value under key, evicting least recently
+        used values until the cache fits its budget. Values
+        larger than the whole budget are not stored.
+
+        :param key: hashable key
+        :param value: value to store
+        :param size: integer representing size in bytes, estimated if None
+        :returns: value
+        """
+
+        if size is None:
+            size = data_size(value)
+
+        self.discard(key)
+        if size > self.max_bytes:
+            return value
+
+        self.items[key] = value
+        self.sizes[key] = size
+        self.nbytes += size
+
+        while ((self.nbytes > self.max_bytes) or
+               (self.max_items is not None and len(self.items) > self.max_items)):
+            oldest = next(iter(self.items))
+            self.discard(oldest)
+            self.evictions += 1
+
+        return value
+
+    def discard(self, key):
+        """
+        discard removes key from the cache if present.
+
+        :param key: hashable key
+        """
+
+        if key in self.items:
+            del self.items[key]
+            self.nbytes -= self.sizes.pop(key)
+
+    def discard_matching(self, test):
+        """
+        discard_matching removes every key passing a test.
+
+        :param test: function of a key returning True to remove it
+        """
+
+        for key in [key for key in self.items if test(key)]:
+            self.discard(key)
+
+    def clear(self):
+        """
+        clear removes every value from the cache. Counters
+        are kept.
+        """
+
+        self.items.clear()
+        self.sizes.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        stats summarises the cache's usage.
+
+        :returns: dictionary of counters
+        """
+
+        lookups = self.hits + self.misses
+        return {'items': len(self.items), 'bytes': self.nbytes,
+                'max_bytes': self.max_bytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.}
+
+
+def data_size(obj, seen=None):
+    """
+    data_size estimates the memory held by an object by adding
+    up the arrays and frames it refers to. Containers and
+    objects with a 'data' attribute, such as holoviews elements,
+    are searched recursively.
+
+    :param obj: object to measure
+    :param seen: set of object ids already counted
+    :returns: integer representing estimated size in bytes
+    """
+
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(obj.memory_usage(index=True, deep=False)))
+    elif isinstance(obj, dict):
+        return sum(data_size(value, seen) for value in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sum(data_size(value, seen) for value in obj)
+    elif hasattr(obj, 'data') and not isinstance(obj, (str, bytes)):
+        return sys.getsizeof(obj) + data_size(obj.data, seen)
+
+    return sys.getsizeof(obj)
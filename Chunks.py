@@ -0,0 +1,636 @@
+""" Chunked Data Sets
+
+This script stores data sets too large for memory on disk and
+answers the questions explore_data asks of them one chunk of
+rows at a time. Every column of every chunk is saved as its own
+numpy file and memory mapped when read, so only the chunk being
+worked on is loaded. Text is saved as the bytes of every value
+one after another, so long values only cost their own length.
+Filters are applied again to each chunk whenever its rows are
+read, so only the number of matching rows per chunk is kept, and
+column statistics are computed from summaries of each chunk that
+are merged together. Only the rows shown on screen are turned
+into a data frame.
+
+To achieve this functionality, run store_file() by providing it
+a csv, tsv or txt file and a directory to store it in, or
+open_frame() with a directory stored before. Then filter it with
+select().
+
+This script requires that numpy and pandas be installed within
+the Python environment you are running this script on.
+"""
+
+
+# Importing libraries
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+# Importing other scripts
+import Frames as fr
+import Aggregates as ag
+
+
+# Rows per chunk written by store_file
+chunk_rows = 1000000
+
+# Most filtered rows loaded for display
+page_rows = 1000
+
+# Bins used to find which values quantiles fall between
+quantile_bins = 4096
+
+# Most values of one bin loaded at once to find a quantile,
+# beyond which the bin is split into smaller bins
+quantile_limit = 5000000
+
+# Most bytes of text compared at once by a filter
+text_block = 2**24
+
+# Comparison operators of the explore_data widgets. Operators are used
+# rather than numpy's ufuncs, which cannot compare text before numpy 1.20
+comparisons = {'less than': operator.lt, 'greater than': operator.gt,
+               'equal to': operator.eq, 'not equal to': operator.ne}
+
+
+class ChunkedFrame(object):
+    """
+    ChunkedFrame is a data set stored on disk by store_file.
+    Quantitative columns keep their numeric type. Qualitative
+    columns are stored as the UTF-8 bytes of their values, the
+    offset at which each value starts, and a separate record of
+    missing values.
+
+    :param directory: string representing directory the data set is stored in
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as file:
+            meta = json.load(file)
+
+        self.directory = directory
+        self.columns = pd.Index(meta['columns'])
+        self.kinds = dict(zip(meta['columns'], meta['kinds']))
+        self.lengths = meta['lengths']
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)]).astype(np.int64)
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def path(self, chunk, column, suffix=''):
+        """
+        Helper function
+
+        path locates the file holding a column of a chunk.
+        Files are named by column position, as column names
+        may not be valid file names.
+
+        :param chunk: integer representing chunk number
+        :param column: string representing column name
+        :param suffix: string added to the file name
+        :returns: string representing file path
+        """
+
+        return os.path.join(chunk_folder(self.directory, chunk),
+                            '{}{}.npy'.format(self.columns.get_loc(column), suffix))
+
+    def values(self, chunk, column):
+        """
+        values memory maps a quantitative column of a chunk.
+
+        :param chunk: integer representing chunk number
+        :param column: string representing column name
+        :returns: numpy array read from disk as needed
+        """
+
+        return np.load(self.path(chunk, column), mmap_mode='r')
+
+    def missing(self, chunk, column):
+        """
+        missing finds the missing values of a column of a chunk.
+
+        :param chunk: integer representing chunk number
+        :param column: string representing column name
+        :returns: numpy array of bools, True where a value is missing
+        """
+
+        if self.kinds[column] == 'qualitative':
+            return np.load(self.path(chunk, column, '_missing'), mmap_mode='r')
+
+        values = self.values(chunk, column)
+        if values.dtype.kind == 'f':
+            return np.isnan(values)
+        return np.zeros(len(values), dtype=bool)
+
+    def text(self, chunk, column, positions):
+        """
+        text reads values of a qualitative column of a chunk.
+        Only the bytes spanning the rows read are loaded.
+
+        :param chunk: integer representing chunk number
+        :param column: string representing column name
+        :param positions: numpy array of row positions within the chunk
+        :returns: numpy array of strings, NaN where a value is missing
+        """
+
+        texts = np.full(len(positions), np.nan, dtype=object)
+        if len(positions) == 0:
+            return texts
+
+        offsets = np.load(self.path(chunk, column, '_offsets'), mmap_mode='r')
+        starts, ends = offsets[positions], offsets[positions + 1]
+        low = starts.min()
+        data = self.values(chunk, column)[low:ends.max()].tobytes()
+
+        present = ~self.missing(chunk, column)[positions]
+        texts[present] = [data[start:end].decode('utf-8') for start, end
+                          in zip(starts[present] - low, ends[present] - low)]
+        return texts
+
+    def matches(self, chunk, column, comparison, value):
+        """
+        matches compares a column of a chunk to a value. Missing
+        values only match 'not equal to', as with pandas.
+
+        :param chunk: integer representing chunk number
+        :param column: string representing column name
+        :param comparison: string representing comparison operator
+        :param value: number or string to compare to
+        :returns: numpy array of bools, True where a row matches
+        """
+
+        if self.kinds[column] != 'qualitative':
+            return comparisons[comparison](self.values(chunk, column), value)
+
+        offsets = np.load(self.path(chunk, column, '_offsets'), mmap_mode='r')
+        equal = text_equal(self.values(chunk, column), offsets, str(value))
+        missing = self.missing(chunk, column)
+        if comparison == 'not equal to':
+            return ~equal | missing
+        return equal & ~missing
+
+    def rows(self, chunk, positions):
+        """
+        rows loads rows of a chunk into a data frame indexed
+        by their row numbers in the whole data set.
+
+        :param chunk: integer representing chunk number
+        :param positions: numpy array of row positions within the chunk
+        :returns: data frame
+        """
+
+        data = {}
+        for column in self.columns:
+            if self.kinds[column] == 'qualitative':
+                data[column] = self.text(chunk, column, positions)
+            else:
+                data[column] = np.asarray(self.values(chunk, column)[positions])
+
+        return pd.DataFrame(data, columns=self.columns, index=self.starts[chunk] + positions)
+
+
+class Selection(object):
+    """
+    Selection holds the rows of a ChunkedFrame matching a
+    filter. Only the number of matching rows of each chunk is
+    kept, and a chunk's matching rows are found again whenever
+    they are read. Statistics are computed over the selected
+    rows a chunk at a time.
+
+    :param frame: ChunkedFrame
+    :param column: string representing column to compare, None to select every row
+    :param comparison: string representing comparison operator
+    :param value: number or string to compare to
+    """
+
+    def __init__(self, frame, column=None, comparison=None, value=None):
+        self.frame = frame
+        self.column = column
+        self.comparison = comparison
+        self.value = value
+
+        if column is None:
+            self.counts = list(frame.lengths)
+        else:
+            self.counts = [int(np.count_nonzero(self.selected(chunk)))
+                           for chunk in range(len(frame.lengths))]
+
+    def __len__(self):
+        return int(sum(self.counts))
+
+    def selected(self, chunk):
+        """
+        selected finds the rows of a chunk matching the filter.
+
+        :param chunk: integer representing chunk number
+        :returns: numpy array of bools, or a slice of every row
+        """
+
+        if self.column is None:
+            return slice(None)
+
+        return self.frame.matches(chunk, self.column, self.comparison, self.value)
+
+    def positions(self, chunk):
+        """
+        positions finds the row positions matching the filter
+        within a chunk.
+
+        :param chunk: integer representing chunk number
+        :returns: numpy array of row positions
+        """
+
+        if self.column is None:
+            return np.arange(self.frame.lengths[chunk])
+
+        return np.flatnonzero(self.selected(chunk))
+
+    def chunk_values(self, column):
+        """
+        chunk_values reads the selected values of a quantitative
+        column, one chunk at a time.
+
+        :param column: string representing column name
+        :returns: generator of numpy arrays
+        """
+
+        for chunk, count in enumerate(self.counts):
+            if count > 0:
+                yield self.frame.values(chunk, column)[self.selected(chunk)]
+
+    def finite_values(self, column):
+        """
+        Helper function
+
+        finite_values reads the selected finite values of a
+        quantitative column, one chunk at a time.
+
+        :param column: string representing column name
+        :returns: generator of numpy arrays of floats
+        """
+
+        for values in self.chunk_values(column):
+            yield ag.finite_values(values)
+
+    def page(self, start=0, rows=None):
+        """
+        page loads selected rows into a data frame.
+
+        :param start: integer representing number of selected rows to skip
+        :param rows: integer representing most rows loaded, page_rows if None
+        :returns: data frame indexed by row numbers in the whole data set
+        """
+
+        remaining = page_rows if rows is None else rows
+        frames = []
+
+        for chunk, count in enumerate(self.counts):
+            if start >= count:
+                start -= count
+                continue
+
+            taken = self.positions(chunk)[start:start + remaining]
+            frames.append(self.frame.rows(chunk, taken))
+
+            remaining -= len(taken)
+            start = 0
+            if remaining <= 0:
+                break
+
+        if len(frames) == 0:
+            return pd.DataFrame(columns=self.frame.columns)
+
+        return pd.concat(frames)
+
+    def moments(self, column):
+        """
+        moments merges the moments of a quantitative column
+        computed on each chunk.
+
+        :param column: string representing column name
+        :returns: tuple produced by Aggregates.moments
+        """
+
+        merged = ag.moments([])
+        for values in self.finite_values(column):
+            merged = ag.merge_moments(merged, ag.moments(values))
+
+        return merged
+
+    def quantiles(self, column, levels, stats):
+        """
+        quantiles computes quantiles of a quantitative column,
+        interpolating between values as pandas does.
+
+        :param column: string representing column name
+        :param levels: list of floats between 0 and 1
+        :param stats: tuple produced by moments for the column
+        :returns: list of floats, one per level
+        """
+
+        count, low, high = stats[0], stats[3], stats[4]
+        if low == high:
+            return [low] * len(levels)
+
+        # Sorted positions of the values each quantile falls between
+        ranks = [(count - 1) * level for level in levels]
+        needed = sorted({int(rank) for rank in ranks} |
+                        {min(int(rank) + 1, count - 1) for rank in ranks})
+        found = self.sorted_values(column, needed, low, high, True)
+
+        result = []
+        for rank in ranks:
+            below = found[int(rank)]
+            above = found[min(int(rank) + 1, count - 1)]
+            result.append(below + (rank - int(rank)) * (above - below))
+
+        return result
+
+    def sorted_values(self, column, positions, low, high, last):
+        """
+        Helper function for quantiles
+
+        sorted_values finds the values at given positions of the
+        sorted values of a column lying between two bounds. Values
+        are counted in equally sized bins to find the bins holding
+        those positions, then only those bins are loaded. Bins
+        with too many values to load are split the same way.
+
+        :param column: string representing column name
+        :param positions: sorted list of integers, counted from low
+        :param low: float representing lowest value included
+        :param high: float representing highest value, excluded unless last
+        :param last: bool indicating whether high is included
+        :returns: dictionary mapping positions to values
+        """
+
+        edges = np.linspace(low, high, quantile_bins + 1)
+
+        def binned(values):
+            inside = (values >= low) & ((values <= high) if last else (values < high))
+            values = values[inside]
+            numbers = np.searchsorted(edges, values, side='right') - 1
+            return values, np.minimum(numbers, quantile_bins - 1)
+
+        counts = np.zeros(quantile_bins, dtype=np.int64)
+        for values in self.finite_values(column):
+            counts += np.bincount(binned(values)[1], minlength=quantile_bins)
+        ends = np.cumsum(counts)
+        bins = np.searchsorted(ends, positions, side='right')
+
+        # Loads the values of bins small enough to fit in memory
+        small = {b for b in set(bins) if counts[b] <= quantile_limit}
+        loaded = {b: [] for b in small}
+        if len(small) > 0:
+            for values in self.finite_values(column):
+                values, numbers = binned(values)
+                for b in small:
+                    loaded[b].append(values[numbers == b])
+        loaded = {b: np.sort(np.concatenate(parts)) for b, parts in loaded.items()}
+
+        found = {}
+        for b in sorted(set(bins)):
+            offsets = [position - (ends[b] - counts[b])
+                       for position, number in zip(positions, bins) if number == b]
+            if b in loaded:
+                values = {offset: loaded[b][offset] for offset in offsets}
+            elif edges[b] == edges[b + 1]:
+                # Bin is too narrow to split, so all its values are equal
+                values = {offset: edges[b] for offset in offsets}
+            else:
+                values = self.sorted_values(column, offsets, edges[b], edges[b + 1],
+                                            last and (b == quantile_bins - 1))
+            for offset, value in values.items():
+                found[offset + ends[b] - counts[b]] = value
+
+        return found
+
+    def value_counts(self, column):
+        """
+        value_counts counts the selected values of a qualitative
+        column, merging the counts of each chunk.
+
+        :param column: string representing column name
+        :returns: pandas series of counts indexed by value, most frequent first
+        """
+
+        merged = pd.Series([], dtype=np.int64)
+        for chunk, count in enumerate(self.counts):
+            if count == 0:
+                continue
+            present = ~self.frame.missing(chunk, column)
+            if self.column is not None:
+                present &= self.selected(chunk)
+            texts = self.frame.text(chunk, column, np.flatnonzero(present))
+            merged = merged.add(pd.Series(texts).value_counts(), fill_value=0)
+
+        return merged.astype(np.int64).sort_values(ascending=False, kind='mergesort')
+
+    def describe(self, column):
+        """
+        describe computes the statistics pandas' describe() shows
+        for a column of the selected rows.
+
+        :param column: string representing column name
+        :returns: data frame with one row of statistics
+        """
+
+        if self.frame.kinds[column] == 'qualitative':
+            counts = self.value_counts(column)
+            stats = {'count': int(counts.sum()), 'unique': len(counts),
+                     'top': counts.index[0] if len(counts) else np.nan,
+                     'freq': int(counts.iloc[0]) if len(counts) else np.nan}
+            return pd.DataFrame([stats], columns=['count', 'unique', 'top', 'freq'])
+
+        stats = self.moments(column)
+        count = stats[0]
+        summary = {'count': float(count), 'mean': np.nan, 'std': np.nan, 'min': np.nan,
+                   '25%': np.nan, '50%': np.nan, '75%': np.nan, 'max': np.nan}
+
+        if count > 0:
+            summary['mean'], summary['min'], summary['max'] = stats[1], stats[3], stats[4]
+            if count > 1:
+                summary['std'] = np.sqrt(stats[2] / (count - 1))
+            quartiles = self.quantiles(column, [0.25, 0.5, 0.75], stats)
+            summary['25%'], summary['50%'], summary['75%'] = quartiles
+
+        return pd.DataFrame([summary], columns=list(summary))
+
+
+def chunk_folder(directory, chunk):
+    """
+    Helper function
+
+    chunk_folder locates the folder holding a chunk's columns.
+
+    :param directory: string representing directory the data set is stored in
+    :param chunk: integer representing chunk number
+    :returns: string representing folder path
+    """
+
+    return os.path.join(directory, 'chunk{:05d}'.format(chunk))
+
+
+def store_file(path, directory, rows=None):
+    """
+    store_file reads a file a chunk at a time and stores it
+    on disk for use as a ChunkedFrame. Column types are taken
+    from the first chunk with a value in the column, so columns
+    missing from the start of the file are stored once a later
+    chunk settles their type, and columns never given a value
+    are stored as quantitative.
+
+    :param path: string representing csv, tsv or txt file path
+    :param directory: string representing directory to store data set in
+    :param rows: integer representing rows per chunk, chunk_rows if None
+    :returns: ChunkedFrame, None if file type is not supported
+    :raises ValueError: if a quantitative column holds text in a later chunk
+    """
+
+    chunks = fr.read_file(path, chunksize=chunk_rows if rows is None else rows)
+    if chunks is None:
+        return None
+
+    columns, kinds, lengths = None, None, []
+    for number, data in enumerate(chunks):
+        if columns is None:
+            columns = [str(column) for column in data.columns]
+            kinds = [None] * len(columns)
+
+        folder = chunk_folder(directory, number)
+        os.makedirs(folder, exist_ok=True)
+        for position, kind in enumerate(kinds):
+            series = data.iloc[:, position]
+            if kind is None:
+                if series.isnull().all():
+                    continue
+                kind = kinds[position] = 'qualitative' if series.dtype == 'O' else 'quantitative'
+                write_missing(directory, position, lengths, kind)
+            write_column(folder, position, series, kind)
+        lengths.append(len(data))
+
+    # Columns without a single value
+    for position, kind in enumerate(kinds or []):
+        if kind is None:
+            kinds[position] = 'quantitative'
+            write_missing(directory, position, lengths, 'quantitative')
+
+    with open(os.path.join(directory, 'meta.json'), 'w') as file:
+        json.dump({'columns': columns, 'kinds': kinds, 'lengths': lengths}, file)
+
+    return ChunkedFrame(directory)
+
+
+def write_missing(directory, position, lengths, kind):
+    """
+    Helper function for store_file
+
+    write_missing saves a column as missing in earlier chunks,
+    once a chunk with a value in it has settled its type.
+
+    :param directory: string representing directory the data set is stored in
+    :param position: integer representing column position
+    :param lengths: list of integers representing rows in each earlier chunk
+    :param kind: string representing whether the column is quantitative or qualitative
+    """
+
+    for number, length in enumerate(lengths):
+        series = pd.Series(np.full(length, np.nan), dtype=float if kind == 'quantitative' else object)
+        write_column(chunk_folder(directory, number), position, series, kind)
+
+
+def write_column(folder, position, series, kind):
+    """
+    Helper function for store_file
+
+    write_column saves a column of a chunk.
+
+    :param folder: string representing chunk folder
+    :param position: integer representing column position
+    :param series: pandas series of the chunk's values
+    :param kind: string representing whether the column is quantitative or qualitative
+    :raises ValueError: if a quantitative column holds values that are not numbers
+    """
+
+    path = os.path.join(folder, '{}.npy'.format(position))
+
+    if kind == 'quantitative':
+        values = series.values
+        if values.dtype.kind not in 'biuf':
+            values = pd.to_numeric(series, errors='coerce').values.astype(float)
+            lost = np.isnan(values) & series.notnull().values
+            if lost.any():
+                raise ValueError('Column {} holds text such as {!r} after numbers in earlier '
+                                 'chunks, store the file with more rows per chunk'
+                                 .format(series.name, series[lost].iloc[0]))
+        np.save(path, values)
+        return
+
+    # Values are saved one after another, with the offset each starts at
+    encoded = [text.encode('utf-8') for text in series.fillna('').astype(str)]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    np.save(os.path.join(folder, '{}_missing.npy'.format(position)), series.isnull().values)
+    np.save(os.path.join(folder, '{}_offsets.npy'.format(position)), offsets)
+    np.save(path, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+def text_equal(data, offsets, value):
+    """
+    Helper function for ChunkedFrame.matches
+
+    text_equal finds the stored values equal to a string by
+    comparing bytes, only for values of the same length.
+
+    :param data: numpy array of the bytes of every value
+    :param offsets: numpy array of the offset each value starts at, and the end
+    :param value: string to compare to
+    :returns: numpy array of bools, True where a value is equal
+    """
+
+    target = np.frombuffer(value.encode('utf-8'), dtype=np.uint8)
+    starts = np.asarray(offsets[:-1])
+    equal = (np.asarray(offsets[1:]) - starts) == len(target)
+    if len(target) == 0:
+        return equal
+
+    # Candidates are compared a block at a time to limit memory
+    candidates = np.flatnonzero(equal)
+    block = max(text_block // len(target), 1)
+    for first in range(0, len(candidates), block):
+        rows = candidates[first:first + block]
+        found = data[starts[rows][:, None] + np.arange(len(target))]
+        equal[rows] = (found == target).all(axis=1)
+
+    return equal
+
+
+def open_frame(directory):
+    """
+    open_frame opens a data set stored before by store_file.
+
+    :param directory: string representing directory the data set is stored in
+    :returns: ChunkedFrame
+    """
+
+    return ChunkedFrame(directory)
+
+
+def select(frame, column=None, comparison=None, value=None):
+    """
+    select filters a ChunkedFrame one chunk at a time. Missing
+    values only match 'not equal to', as with pandas.
+
+    :param frame: ChunkedFrame
+    :param column: string representing column to compare, None to select every row
+    :param comparison: string representing comparison operator
+    :param value: number or string to compare to
+    :returns: Selection
+    """
+
+    return Selection(frame, column, comparison, value)
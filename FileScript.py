@@ -4,20 +4,55 @@ This script loads in an existing data frame from your notebook
 and displays its contents to the user. Users can then select and 
 modify the file through the use of widgets.
 
+Edits are recorded as the rows and columns kept rather than as
+copies of the data frame, so several users can edit the same data
+frame at once, each in their own session.
+
 To achieve this functionality, simply run modify_data() by 
 providing it with a valid data frame.
 
+The edits themselves and the file reading helpers are kept in
+Frames, which can be imported without panel.
+
 This script requires that pandas and panel be installed 
 within the Python environment you are running this script on.
 """
 
 
 # Importing libraries
-import pandas as pd
 import panel as pn
 
-# Loading extensions
-pn.extension()
+# Importing other scripts
+import Frames as fr
+import Scheduler as sc
+import Sessions as sn
+
+
+def session_state():
+    """
+    Helper function
+
+    session_state lists the values this script keeps for each
+    session, with their starting values.
+
+    :returns: dictionary of starting values
+    """
+
+    return {'header_vals': [], 'change': '', 'started': False, 'head_val': 1,
+            'active_data': None, 'edits': None, 'previous': None, 'final_df': None}
+
+
+sn.session_module(__name__, session_state)
+
+
+def get_state():
+    """
+    get_state returns this script's state for the current session.
+
+    :returns: Sessions.State
+    """
+
+    return sn.get_state(__name__)
 
 
 def modify_data(df, path):
@@ -27,13 +62,13 @@ def modify_data(df, path):
     modify_data displays all necessary widgets to view, 
     modify, and save a data frame from a notebook.
 
-    :param df: data frame from notbook
+    :param df: data frame from notbook, not modified
     :param path: string representing file path
     :returns: data frame with editor widgets
     """
             
-    # Reads in data 
-    data = df.copy()
+    # Reads in data, edits refer to it rather than copying it
+    data = df
     
     # Row Selector widget
     row_selection = pn.widgets.IntSlider(name='Navigate Rows', 
@@ -71,18 +106,15 @@ def modify_data(df, path):
                               margin=(10, 0, 0, 55), width=200)
    
     # Keeps track of last change to data frame in case of an undo
-    global header_vals
-    global change
-    header_vals = []
-    change = ''
+    state = get_state()
+    state.header_vals = []
+    state.change = ''
     
     # Variables that help detect changes in headers
-    global started
-    global head_val
-    head_val = 1
-    started = False
+    state.head_val = 1
+    state.started = False
 
-    @pn.depends(row_selection.param.value, col_selection.param.value, 
+    @sc.depends(row_selection.param.value, col_selection.param.value, 
                 radio_selection.param.value, dropper.param.value, 
                 head_selection.param.value, undo.param.value, saver.param.value)
     def select_data(row, col, radio, drop, head, back, save):
@@ -102,7 +134,7 @@ def modify_data(df, path):
         """
         
         # Please note: Any function that is dependent on a widgets value 
-        # (@pn.depends), like this one, will run every time one of the widget's
+        # (@sc.depends), like this one, will run every time one of the widget's
         # value is changed. However, this is not limited to a user changing the
         # widgets, but also changed programmatically as well. This is done a
         # few times across this function which leads to redundant calls.
@@ -111,45 +143,29 @@ def modify_data(df, path):
         # such as 'started' or 'head_val' to detect a change in the header selector.
 
         # Checks for previous run of this function or change in data
-        global active_data
-        global updated_df
-        global stored_data
-        global previous_stored
-        global previous_df
-        global change
-        global started
-        global head_val
-        
-        if ('updated_df' in globals()) and (path == active_data):
-            df = updated_df.copy()
-        else:
-            active_data = path
-            df = data.copy()
-            stored_data = df.copy()
-            previous_stored = stored_data.copy()
-            previous_df = df.copy()
-            updated_df = df.copy()
+        if (state.edits is None) or (path != state.active_data):
+            state.active_data = path
+            state.edits = fr.Edits(data)
+            state.previous = state.edits
+        edits = state.edits
         
         # Checks for click on the undo button
         if back:
             undo.value = False
             
-            if change == '':
-                return updated_df.iloc[row:row+5, col:col+11]
+            if state.change == '':
+                return state.edits.page(row, col)
             
-            elif change == 'header':
-                change = 'skip'
-                if len(header_vals) > 1:
-                    head_selection.value = header_vals[-2]
+            elif state.change == 'header':
+                state.change = 'skip'
+                if len(state.header_vals) > 1:
+                    head_selection.value = state.header_vals[-2]
                 else:
-                    head_selection.value = header_vals[0]
-                
-            elif change == 'axis':
-                stored_data = previous_stored.copy()
+                    head_selection.value = state.header_vals[0]
             
-            change = ''
-            updated_df = previous_df.copy()
-            return updated_df.iloc[row:row+5, col:col+11]
+            state.change = ''
+            state.edits = state.previous
+            return state.edits.page(row, col)
 
         # Instantiates data and enables widgets
         if radio == 'Columns':
@@ -158,45 +174,38 @@ def modify_data(df, path):
         else:
             col_drop.disabled = True
             row_drop.disabled = False
-        row_selection.start, row_selection.end = 0, len(df) - 1
-        col_selection.start, col_selection.end = 0, len(df.columns)
+        row_selection.start, row_selection.end = 0, len(edits) - 1
+        col_selection.start, col_selection.end = 0, len(edits.columns())
 
         # Combines header rows and creates data frame with appropriate header
         # Checks to see if header value changed
-        if ((head != head_val) or not started) and (change != 'skip'):
+        if ((head != state.head_val) or not state.started) and (state.change != 'skip'):
             # Stores head values in case an undo is selected
-            change = 'header'
-            header_vals.append(head)
+            state.change = 'header'
+            state.header_vals.append(head)
             
-            head_rows = stored_data.iloc[0:head-1].T.reset_index().fillna('')
-            columns = head_rows.apply(lambda row: ' '.join(row.values.astype(str)), axis=1)
-
-            updated_df = stored_data.copy()
-            updated_df.columns = columns
-            updated_df = updated_df.iloc[head-1:]
+            state.previous = state.edits
+            state.edits = state.edits.with_head(head)
             
-            started = True
-            head_val = head
+            state.started = True
+            state.head_val = head
             
-        col_drop.options = list(updated_df.columns)
+        col_drop.options = list(state.edits.columns())
 
         # Updates data frame when column/row is dropped
         if drop:
             if (row_drop.value == '') and (radio == 'Rows'):
                 dropper.value = False
-                return updated_df.iloc[row:row+5, col:col+11]
+                return state.edits.page(row, col)
             
-            change = 'axis'
+            state.change = 'axis'
             dropper.value = False
             if radio == 'Columns':
-                previous_df = updated_df.copy()
-                col_index = updated_df.columns.get_loc(col_drop.value)
-                updated_df = updated_df.drop(col_drop.value, axis=1)
-                previous_stored = stored_data.copy()
-                stored_data = stored_data.drop(stored_data.columns[col_index], axis=1)
+                state.previous = state.edits
+                state.edits = state.edits.drop_column(col_drop.value)
                 dropper.value = False
             else:
-                poss_values = [str(x) for x in list(df.index)]
+                poss_values = [str(x) for x in list(edits.index())]
                 
                 # Checks for range of values
                 if '-' in row_drop.value:
@@ -208,38 +217,36 @@ def modify_data(df, path):
                         # Checks for invalid row number
                         if (not bound.isdigit()) or (bound not in poss_values):
                             dropper.value = False
-                            return updated_df.iloc[row:row+5, col:col+11]
+                            return state.edits.page(row, col)
                     
                     # Removes range of values
-                    previous_df = updated_df.copy()
-                    lower_frame = updated_df[updated_df.index < int(lower)]
-                    upper_frame = updated_df[updated_df.index > int(upper)]
-                    updated_df = pd.concat([lower_frame, upper_frame])
-                    previous_stored = stored_data.copy()
-                    stored_lower_frame = stored_data[stored_data.index < int(lower)]
-                    stored_upper_frame = stored_data[stored_data.index > int(upper)]
-                    stored_data = pd.concat([stored_lower_frame, stored_upper_frame])
+                    state.previous = state.edits
+                    state.edits = state.edits.drop_rows(int(lower), int(upper))
                     row_drop.value = ''
                   
                 else:    
                     # Checks for invalid row number
                     if (not row_drop.value.isdigit()) or (row_drop.value not in poss_values):
                         dropper.value = False
-                        return updated_df.iloc[row:row+5, col:col+11]
+                        return state.edits.page(row, col)
 
-                    previous_df = updated_df.copy()
-                    updated_df = updated_df.drop(int(row_drop.value))
-                    previous_stored = stored_data.copy()
-                    stored_data = stored_data.drop(int(row_drop.value))
+                    state.previous = state.edits
+                    state.edits = state.edits.drop_rows(int(row_drop.value), int(row_drop.value))
                     row_drop.value = ''
 
-        # Saves data frame when user clicks save widget
+        # Saves data frame when user clicks save widget. The plots and
+        # geocoder need a data frame, so the edits are copied once, and
+        # sessions saving the same edits of a shared data frame share it
         if save:
-            global final_df
-            final_df = updated_df.reset_index(drop=True)
+            signature = state.edits.signature()
+            if signature == (1, None, None):
+                state.final_df = state.edits.frame()
+            else:
+                state.final_df = sn.shared_derived(state.edits.data, ('saved',) + signature,
+                                                   state.edits.frame)
             saver.value = False
 
-        return updated_df.iloc[row:row+5, col:col+11]
+        return state.edits.page(row, col)
 
     # Displays widgets
     if len(df.columns) <= 11:
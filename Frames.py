@@ -0,0 +1,259 @@
+""" Data Frame Edits
+
+This script holds the parts of the data editor that do not need
+widgets: reading csv, tsv and txt files, combining header rows,
+dropping rows, and describing edits as the rows and columns kept
+rather than as copies of the data frame. The batch wrangler and
+chunked storage use them without importing panel.
+
+To achieve this functionality, read a file with read_file() and
+edit it through Edits(data).
+
+This script requires that numpy and pandas be installed within
+the Python environment you are running this script on.
+"""
+
+
+# Importing libraries
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Importing other scripts
+import Profiler as prof
+
+
+class Edits(object):
+    """
+    Edits describes changes made to a data frame without
+    copying it: the positions of the rows and columns kept and
+    the number of header rows. Changes return new Edits, so
+    earlier ones can be kept for undo, and rows are only copied
+    when displayed or saved.
+
+    :param data: data frame, not modified
+    :param rows: numpy array of row positions kept, None for every row
+    :param cols: numpy array of column positions kept, None for every column
+    :param head: integer representing number of header rows
+    """
+
+    def __init__(self, data, rows=None, cols=None, head=1):
+        self.data = data
+        self.rows = rows
+        self.cols = cols
+        self.head = head
+
+    def __len__(self):
+        kept = len(self.data) if self.rows is None else len(self.rows)
+        return max(kept - (self.head - 1), 0)
+
+    def row_positions(self):
+        """
+        row_positions lists the positions of the rows kept,
+        including header rows.
+
+        :returns: numpy array of row positions
+        """
+
+        return np.arange(len(self.data)) if self.rows is None else self.rows
+
+    def col_positions(self):
+        """
+        col_positions lists the positions of the columns kept.
+
+        :returns: numpy array of column positions
+        """
+
+        return np.arange(len(self.data.columns)) if self.cols is None else self.cols
+
+    def body_positions(self, start=0, stop=None):
+        """
+        body_positions lists the positions of the rows kept
+        below the header rows.
+
+        :param start: integer representing first row below the header
+        :param stop: integer representing row to stop before, None for every row
+        :returns: numpy array of row positions
+        """
+
+        first = self.head - 1
+        if self.rows is not None:
+            return self.rows[first:][start:stop]
+
+        stop = len(self) if stop is None else min(stop, len(self))
+        return np.arange(first + start, first + max(stop, start))
+
+    def columns(self):
+        """
+        columns names the columns kept, combining header rows.
+
+        :returns: pandas index of column names
+        """
+
+        if self.rows is None:
+            first = np.arange(min(self.head, len(self.data)))
+        else:
+            first = self.rows[:self.head]
+        header = self.data.iloc[first, self.col_positions()]
+        return combine_headers(header, self.head).columns
+
+    def index(self):
+        """
+        index lists the labels of the rows kept below the header.
+
+        :returns: pandas index of row labels
+        """
+
+        return self.data.index[self.body_positions()]
+
+    def page(self, row, col, rows=5, cols=11):
+        """
+        page copies part of the edited data frame for display.
+
+        :param row: integer representing first row to show
+        :param col: integer representing first column to show
+        :param rows: integer representing number of rows to show
+        :param cols: integer representing number of columns to show
+        :returns: data frame
+        """
+
+        frame = self.data.iloc[self.body_positions(row, row + rows),
+                               self.col_positions()[col:col + cols]]
+        frame.columns = self.columns()[col:col + cols]
+
+        return frame
+
+    def frame(self):
+        """
+        frame copies the edited data frame, numbering its rows
+        from zero. The data frame itself is returned if unedited.
+
+        :returns: data frame
+        """
+
+        if (self.rows is None) and (self.cols is None) and (self.head == 1) and \
+           self.data.index.equals(pd.RangeIndex(len(self.data))):
+            return self.data
+
+        frame = self.data.iloc[self.row_positions(), self.col_positions()]
+        return combine_headers(frame, self.head).reset_index(drop=True)
+
+    def signature(self):
+        """
+        signature summarises the edits, so that equal edits of the
+        same data frame can be recognised without comparing rows.
+
+        :returns: tuple of the number of header rows and digests of
+                  the row and column positions kept
+        """
+
+        def digest(positions):
+            if positions is None:
+                return None
+            return hashlib.sha1(np.ascontiguousarray(positions)).hexdigest()
+
+        return (self.head, digest(self.rows), digest(self.cols))
+
+    def with_head(self, head):
+        """
+        with_head changes the number of header rows.
+
+        :param head: integer representing number of header rows
+        :returns: Edits
+        """
+
+        return Edits(self.data, self.rows, self.cols, head)
+
+    def drop_column(self, name):
+        """
+        drop_column removes a column by its name.
+
+        :param name: string representing column name
+        :returns: Edits
+        """
+
+        keep = np.asarray(self.columns() != name)
+        return Edits(self.data, self.rows, self.col_positions()[keep], self.head)
+
+    def drop_rows(self, lower, upper):
+        """
+        drop_rows removes rows whose index falls between
+        two row numbers, inclusive, as drop_range does.
+
+        :param lower: integer representing first row to drop
+        :param upper: integer representing last row to drop
+        :returns: Edits
+        """
+
+        rows = self.row_positions()
+        labels = self.data.index[rows]
+        keep = np.asarray((labels < lower) | (labels > upper))
+        return Edits(self.data, rows[keep], self.cols, self.head)
+
+
+@prof.instrument()
+def read_file(path, chunksize=None):
+    """
+    read_file reads a csv, tsv or txt file into a data frame.
+    Tab separated values are expected in tsv and txt files.
+    
+    :param path: string representing file path
+    :param chunksize: integer representing rows per data frame, None to read all rows
+    :returns: data frame, or iterator of data frames if chunksize is given,
+              None if file type is not supported
+    """
+    
+    if path.endswith(('.txt', 'tsv')):
+        try:
+            data = pd.read_csv(path, sep='\t', encoding="latin-1", chunksize=chunksize)
+        except UnicodeDecodeError:
+            data = pd.read_csv(path, sep='\t', encoding="ISO-8859-1", chunksize=chunksize)
+    elif path.endswith('.csv'):
+        try:
+            data = pd.read_csv(path, encoding="latin-1", chunksize=chunksize)
+        except UnicodeDecodeError:
+            data = pd.read_csv(path, encoding="ISO-8859-1", chunksize=chunksize)
+    else:
+        return None
+    
+    return data
+
+
+@prof.instrument()
+def combine_headers(data, head):
+    """
+    combine_headers joins the header row and the first rows
+    below it into a single header.
+    
+    :param data: data frame
+    :param head: integer representing number of header rows
+    :returns: data frame with combined header
+    """
+    
+    head_rows = data.iloc[0:head-1].T.reset_index().fillna('')
+    columns = head_rows.apply(lambda row: ' '.join(row.values.astype(str)), axis=1)
+
+    # Shallow copy, so the values are shared with data
+    combined = data.copy(deep=False)
+    combined.columns = columns
+    
+    return combined.iloc[head-1:]
+
+
+@prof.instrument()
+def drop_range(data, lower, upper):
+    """
+    drop_range removes rows whose index falls between
+    two row numbers, inclusive.
+    
+    :param data: data frame
+    :param lower: integer representing first row to drop
+    :param upper: integer representing last row to drop
+    :returns: data frame without the dropped rows
+    """
+    
+    lower_frame = data[data.index < lower]
+    upper_frame = data[data.index > upper]
+    
+    return pd.concat([lower_frame, upper_frame])
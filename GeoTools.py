@@ -11,16 +11,48 @@ this script on.
 """
 
 # Importing libraries
+from functools import partial
+
 import requests
 import pandas as pd
 import numpy as np
 import panel as pn
 
 # Importing required scripts
-import HoloV as ho
+import Scheduler as sc
+import Profiler as prof
+import Sessions as sn
+
+# dstk API url, addresses are appended to it
+geocode_url = "http://www.datasciencetoolkit.org/maps/api/geocode/json?sensor=false&address="
 
-# Loading extensions
-pn.extension()
+
+def session_state():
+    """
+    Helper function
+
+    session_state lists the values this script keeps for each
+    session, with their starting values.
+
+    :returns: dictionary of starting values
+    """
+
+    # Geocoded and non-geocoded values are reset by geocoder()
+    return {'progress_geocode': None, 'reporter': None,
+            'is_geocoded': [], 'not_geocoded': []}
+
+
+sn.session_module(__name__, session_state)
+
+
+def get_state():
+    """
+    get_state returns this script's state for the current session.
+
+    :returns: Sessions.State
+    """
+
+    return sn.get_state(__name__)
 
 
 def geocoder(df):
@@ -32,6 +64,11 @@ def geocoder(df):
     :param df: data frame containing a column that can be geocoded
     :returns: widgets to select column to geocode
     """
+    
+    # Imported here so geocode_column can be used without the display scripts
+    import HoloV as ho
+    import FileScript as fs
+    
     # Determine string columns
     is_string = df.dtypes == 'object'
     options = is_string[is_string==True]
@@ -43,17 +80,85 @@ def geocoder(df):
     geo_button = pn.widgets.Toggle(name='Geocode', margin=(15,0,0,30), width=200)
     
     # Progress widget
-    global progress_geocode
+    state = get_state()
     progress_geocode = pn.pane.Markdown('')
+    state.progress_geocode = progress_geocode
+    
+    # Progress is reported from a worker thread while geocoding
+    state.reporter = sc.on_ui_thread(show_progress)
     
     # Stores geocoded and non-geocoded values
-    global is_geocoded
-    global not_geocoded
-    is_geocoded = []
-    not_geocoded = []
+    state.is_geocoded = []
+    state.not_geocoded = []
+    
+    # Stores report or error of the last geocoding run
+    reports = []
 
 
-    @pn.depends(geo_button.param.value)
+    @prof.instrument()
+    def show_report(column, address_dict):
+        """
+        show_report adds latitude and longitude columns once
+        geocoding is finished and reports geocoded values.
+        
+        :param column: string representing geocoded column
+        :param address_dict: dictionary of addresses and coordinates
+        :returns: updated data frame with latitude and longitude columns
+        """
+        
+        nonlocal df
+        
+        # Creating latitude/longitude columns on a shallow copy, as the
+        # data frame may be shared with other sessions
+        updated_df = df.copy(deep=False)
+        add_coordinates(updated_df, column, address_dict)
+        
+        # Replaces the data frame wherever this session uses it
+        for script, names in [(ho, ['df', 'original_df']), (fs, ['final_df'])]:
+            script_state = script.get_state()
+            for name in names:
+                if getattr(script_state, name) is df:
+                    setattr(script_state, name, updated_df)
+        df = updated_df
+        ho.data_changed()
+
+        progress_geocode.object = ''
+        
+        report_message = pn.pane.Markdown('**Geocoding Finished:**', margin=(24,20,0,0))
+        geocoded_vals = pn.widgets.Select(name='Geocoded Values', options=state.is_geocoded, width=200)
+        non_geocoded_vals = pn.widgets.Select(name='Non Geocoded Values', options=state.not_geocoded, 
+                                              width=200)
+        full_report = pn.Row(report_message, geocoded_vals, non_geocoded_vals, margin=(5,0,20,0))
+                        
+        row_slider = ho.view_data(updated_df, True, True)
+        full_display = pn.Column(full_report, row_slider)
+        reports.append(full_display)
+        
+        geo_button.disabled = False
+        geo_button.value = False
+
+        return full_display
+    
+    def show_failure(error):
+        """
+        show_failure reports an error raised while geocoding
+        and re-enables the geocode button so it can be retried.
+        
+        :param error: exception raised by geocode_column
+        :returns: error message and data frame
+        """
+        
+        progress_geocode.object = ''
+        
+        failure_display = pn.Column(sc.error_message(error), ho.view_data(df, True, True))
+        reports.append(failure_display)
+        
+        geo_button.disabled = False
+        geo_button.value = False
+        
+        return failure_display
+    
+    @sc.depends(geo_button.param.value)
     def geocode_trigger(click):
         """
         geocode_trigger initializes geocoding when the 
@@ -64,47 +169,31 @@ def geocoder(df):
         """
         
         updated_df = df
+        
+        # Keeps showing the last report once the button is released
+        if not click:
+            if len(reports) > 0:
+                return reports[-1]
+            return ho.view_data(updated_df, True, True)
+        
         if geo_select.value == 'None':
             geo_button.value = False
             return ho.view_data(updated_df, True, True)
-
-        if geo_button.value == True:
-            # Temporarily disables geocode button
-            geo_button.disabled = True
-            geo_button.value = False
-            return 'Geocoding in progress. Please wait..'
         
         # Checks for existing latitude/longitude columns
         for col in updated_df.columns:
             if ('latitude' in col.lower()) or ('longitude' in col.lower()):
+                geo_button.value = False
                 error = '#####Coordinate columns already exist.'
                 return pn.Column(error, ho.view_data(updated_df, True, True))
-            
-        # Geocodes and stores latitude/longitude for each address
-        unique_vals = updated_df[geo_select.value].dropna().unique()
-        coords = pd.Series(unique_vals).apply(get_coords)
-        address_dict = {}
-        coords.apply(lambda address: address_dict.update(address))
-        
-        # Creating latitude/longitude columns
-        updated_df['Latitude'] = (updated_df[geo_select.value]
-                                  .map(address_dict)
-                                  .apply(lambda x: x[0] if type(x) == list else None))
-        updated_df['Longitude'] = (updated_df[geo_select.value]
-                                   .map(address_dict)
-                                   .apply(lambda x: x[1] if type(x) == list else None))
-
-        progress_geocode.object = ''
         
-        report_message = pn.pane.Markdown('**Geocoding Finished:**', margin=(24,20,0,0))
-        geocoded_vals = pn.widgets.Select(name='Geocoded Values', options=is_geocoded, width=200)
-        non_geocoded_vals = pn.widgets.Select(name='Non Geocoded Values', options=not_geocoded, width=200)
-        full_report = pn.Row(report_message, geocoded_vals, non_geocoded_vals, margin=(5,0,20,0))
-                        
-        row_slider = ho.view_data(updated_df, True, True)
-        full_display = pn.Column(full_report, row_slider)
-
-        return full_display
+        # Temporarily disables geocode button while addresses
+        # are geocoded in a worker thread
+        geo_button.disabled = True
+        return sc.defer(geocode_column, partial(show_report, geo_select.value), 
+                        updated_df[geo_select.value], 
+                        message='Geocoding in progress. Please wait..', failed=show_failure)
+    
     
     geo_widgets = pn.Row(geo_select, geo_button, margin=(0,0,15,0))
     widgets = pn.Column(geo_widgets, geocode_trigger, progress_geocode)
@@ -112,6 +201,71 @@ def geocoder(df):
     return widgets
 
 
+@prof.instrument()
+def geocode_column(column):
+    """
+    geocode_column geocodes every unique value of a column.
+    
+    :param column: pandas series of locations
+    :returns: dictionary with keys as addresses and
+              values as latitude/longitude coordinates
+    """
+    
+    unique_vals = column.dropna().unique()
+    coords = pd.Series(unique_vals).apply(get_coords)
+    address_dict = {}
+    coords.apply(lambda address: address_dict.update(address))
+    
+    return address_dict
+
+
+@prof.instrument()
+def add_coordinates(df, column, address_dict):
+    """
+    add_coordinates adds latitude and longitude columns to
+    a data frame from the coordinates of a geocoded column.
+    
+    :param df: data frame containing the geocoded column
+    :param column: string representing geocoded column
+    :param address_dict: dictionary of addresses and coordinates
+    """
+    
+    df['Latitude'] = (df[column]
+                      .map(address_dict)
+                      .apply(lambda x: x[0] if type(x) == list else None))
+    df['Longitude'] = (df[column]
+                       .map(address_dict)
+                       .apply(lambda x: x[1] if type(x) == list else None))
+
+
+def show_progress(text):
+    """
+    Helper function for geocoder
+    
+    show_progress displays the geocoding progress table.
+    
+    :param text: string representing progress in markdown
+    """
+    
+    get_state().progress_geocode.object = text
+
+
+def update_progress(text):
+    """
+    Helper function for get_coords
+    
+    update_progress reports geocoding progress to the progress
+    widget of the session's geocoder(), if one is displayed.
+    
+    :param text: string representing progress in markdown
+    """
+    
+    reporter = get_state().reporter
+    if reporter is not None:
+        reporter(text)
+
+
+@prof.instrument()
 def get_coords(address):
     """
     get_coords uses the data science tool kit to geocode
@@ -122,27 +276,26 @@ def get_coords(address):
               values as latitude/longitude coordinates
     """
         
+    state = get_state()
+    
     # Base progress menu for geocoder
     base_progress = ('| Placename | Status | Latitude | Longitude |' + 
                      '\n|:---------:|:-------:|:--------:|:---------:|')
     
     if pd.isnull(address):
-        progress_geocode.object = base_progress + '\n| Null | Failed | Null | Null |'
+        update_progress(base_progress + '\n| Null | Failed | Null | Null |')
         return 
     
-    # dstk API url
-    partial_url = "http://www.datasciencetoolkit.org/maps/api/geocode/json?sensor=false&address="
-    
     # Reformats string to work with dstk API
     address_reformat = address.replace(" ", "+").replace("'", "")
     
     # Geocodes address
-    response = requests.get(partial_url+address_reformat).json()
+    response = requests.get(geocode_url+address_reformat).json()
     
     # Handles case of no results/invalid address
     if response['status'] == 'ZERO_RESULTS':
-        not_geocoded.append(address)
-        progress_geocode.object = base_progress + '\n| ' + address + ' | Failed | Null | Null |'
+        state.not_geocoded.append(address)
+        update_progress(base_progress + '\n| ' + address + ' | Failed | Null | Null |')
         return {address: [None, None]}
     
     # Extracts result
@@ -150,13 +303,9 @@ def get_coords(address):
     lat = coords['lat']
     lon = coords['lng']
     
-    progress_geocode.object = base_progress + ('\n| ' + address + ' | Geocoded | ' + 
-                                               str(lat) + ' | ' + str(lon) + ' |')
+    update_progress(base_progress + ('\n| ' + address + ' | Geocoded | ' + 
+                                     str(lat) + ' | ' + str(lon) + ' |'))
     
-    is_geocoded.append(address)
+    state.is_geocoded.append(address)
     
     return {address: [lat, lon]}
-
-
-
-    
\ No newline at end of file
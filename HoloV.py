@@ -13,6 +13,12 @@ data set was modified in the accompanying script 'FileScript'
 through the 'variable selector widget', select_data() should be
 run after this. If no modifications were made, you may continue.
 
+Files too large for memory can be explored by running
+load_chunked() in place of view_data() and select_data().
+
+Holoviews, hvplot and datashader are imported the first time
+a plot is needed, so the other functions load without them.
+
 This script requires that pandas, panel, holoviews, hvplot, 
 and datashader be installed within the Python environment you 
 are running this script on.
@@ -20,20 +26,111 @@ are running this script on.
 
 
 # Importing libraries
+import itertools
+import os
+import threading
+from functools import partial
+
+import numpy as np
 import panel as pn
-import holoviews as hv
-from holoviews import opts
-import hvplot.pandas
-import datashader.geo
 import pandas as pd
-from holoviews.element.tiles import OSM
 
 # Importing other scripts
 import FileScript as fs
+import Frames as fr
+import Indexes as ix
+import Aggregates as ag
+import Caching as cc
+import Scheduler as sc
+import Profiler as prof
+import Chunks as ch
+import Sessions as sn
+
+# Plotting libraries, imported by load_plotting() when first needed
+hv = None
+opts = None
+OSM = None
+
+# Guards load_plotting() against plots built in worker threads
+plotting_lock = threading.Lock()
+
+# Numbers data versions, unique across sessions as plot_cache is shared
+versions = itertools.count(1)
+
+
+def session_state():
+    """
+    Helper function
+
+    session_state lists the values this script keeps for each
+    session, with their starting values. Data frames are shared
+    between sessions and must not be modified in place, and
+    indexes built from them are shared through Sessions.
+
+    :returns: dictionary of starting values
+    """
+
+    return {
+        'original_df': None, 'df': None,
+        'quantitative': [], 'qualitative': [],
+        # Changed whenever the selected data frame changes
+        'data_version': next(versions)}
+
+
+def release_plots(state):
+    """
+    Helper function
+
+    release_plots removes the plots of a session's current data
+    version from plot_cache, so the data frames they refer to
+    can be freed. Runs when the data changes or the session closes.
+
+    :param state: Sessions.State of this script
+    """
 
-# Loading extensions
-pn.extension()
-hv.extension('bokeh')
+    version = state.data_version
+    plot_cache.discard_matching(lambda key: key[0] == version)
+
+
+sn.session_module(__name__, session_state, release_plots)
+
+
+def get_state():
+    """
+    get_state returns this script's state for the current session.
+
+    :returns: Sessions.State
+    """
+
+    return sn.get_state(__name__)
+
+
+def load_plotting():
+    """
+    load_plotting imports holoviews, hvplot and the map tiles
+    and loads the bokeh extension. Importing them takes most of
+    the time needed to import this script, so it is done the
+    first time a plot is needed rather than on import.
+    """
+    
+    global hv
+    global opts
+    global OSM
+    
+    with plotting_lock:
+        if hv is not None:
+            return
+        
+        import holoviews
+        import hvplot.pandas
+        from holoviews.element.tiles import OSM as tiles
+        
+        # Loading extensions
+        holoviews.extension('bokeh')
+        
+        opts = holoviews.opts
+        OSM = tiles
+        hv = holoviews
 
 
 def view_data(path, df=False, rows=True):
@@ -42,55 +139,51 @@ def view_data(path, df=False, rows=True):
     data frame that allows the user to navigate rows
     and columns
     
-    :param path: file path
+    :param path: file path, or data frame to display
     :param df: whether input is data frame
     :param rows: whether to show row widget
     :returns: interactive data frame display
     """
     
-    global original_df
-    
     if not df:
-        # Reading file at path
-        if path.endswith(('.txt', 'tsv')):
-            try:
-                data = pd.read_csv(path, sep='\t', encoding="latin-1")
-            except UnicodeDecodeError:
-                data = pd.read_csv(path, sep='\t', encoding="ISO-8859-1")
-        elif path.endswith('.csv'):
-            try:
-                data = pd.read_csv(path, encoding="latin-1")
-            except UnicodeDecodeError:
-                data = pd.read_csv(path, encoding="ISO-8859-1")
-        else:
+        # Reading file at path, loaded once for every session
+        data = sn.shared_dataset(path, fr.read_file)
+        if data is None:
             return None
     
         # Reads in data set
-        original_df = data
+        get_state().original_df = data
     
     else:
-        # Reads in data set
-        original_df = path
+        # Displays data frame
+        data = path
+    
+    # Filtered rows are kept as positions in the data frame, and
+    # only the rows shown are copied
+    if not isinstance(data, fr.Edits):
+        data = fr.Edits(data)
+    n_cols = len(data.col_positions())
         
     # Row Selector widget
     row_selection = pn.widgets.IntSlider(name='Navigate Rows', start=0, 
-                                         end=len(original_df)-1, width=300, 
+                                         end=len(data)-1, width=300, 
                                          margin=(25,50,-15,15))
 
     # Column Selector widget
     col_selection = pn.widgets.IntSlider(name='Navigate Columns', start=0, 
-                                         end=len(original_df.columns)-1, width=300, 
+                                         end=n_cols-1, width=300, 
                                          margin=(25,0,5,5))
         
-    if len(original_df.columns) <= 10:
+    if n_cols <= 10:
         if not rows:
-            widgets = pn.Column(original_df)
+            widgets = pn.Column(data.page(0, 0, len(data), n_cols))
         else:
             row_selection.margin = (25,50,5,15)
             # Produces slider widget to interactively view columns
             @pn.depends(row_selection.param.value)
+            @prof.instrument()
             def select_row(row=0):
-                return original_df.iloc[row:row+4, :]
+                return data.page(row, 0, 4, n_cols)
 
             widgets = pn.Column(row_selection, select_row)
 
@@ -98,8 +191,9 @@ def view_data(path, df=False, rows=True):
 
         # Produces slider widget to interactively view rows and columns
         @pn.depends(row_selection.param.value, col_selection.param.value)
+        @prof.instrument()
         def select_row(row=0, col=0):
-            return original_df.iloc[row:row+4, col:col+10]
+            return data.page(row, col, 4, 10)
 
         selector = pn.Row(row_selection, col_selection)
         widgets = pn.Column(selector, select_row)
@@ -108,14 +202,51 @@ def view_data(path, df=False, rows=True):
 
         # Produces slider widget to interactively view columns
         @pn.depends(col_selection.param.value)
+        @prof.instrument()
         def select_row(col=0):
-            return original_df.iloc[:, col:col+10]
+            return data.page(0, col, len(data), 10)
 
         widgets = pn.Column(col_selection, select_row)
     
     return widgets
 
 
+def load_chunked(path, directory):
+    """
+    load_chunked stores a file too large for memory on disk
+    in chunks and selects it for analysis with explore_data.
+    Files stored before can be reopened by passing path as None.
+    
+    :param path: string representing csv, tsv or txt file path, None to reopen
+    :param directory: string representing directory to store data set in
+    :returns: interactive display of the first rows of the data set
+    """
+    
+    state = get_state()
+    if path is not None:
+        if ch.store_file(path, directory) is None:
+            return None
+    
+    # Opened once for every session, so indexes built from it are shared
+    state.df = sn.shared_dataset(os.path.join(directory, 'meta.json'), open_stored)
+    data_changed()
+    
+    return view_data(ch.select(state.df).page(), True)
+
+
+def open_stored(path):
+    """
+    Helper function for load_chunked
+    
+    open_stored opens a data set stored in chunks.
+    
+    :param path: string representing path of the data set's meta.json
+    :returns: ChunkedFrame
+    """
+    
+    return ch.open_frame(os.path.dirname(path))
+
+
 def select_data():
     """
     select_data allows users to select the data frame
@@ -125,12 +256,14 @@ def select_data():
     """
     
     # Determines the existance of a user created data frame
+    state = get_state()
     possible_opts = ['---','Original', 'Saved']
-    saved =  hasattr(fs, 'final_df')
-    original = 'original_df' in globals()
+    saved = fs.get_state().final_df is not None
+    original = state.original_df is not None
     true_opts = possible_opts[:original+saved+1]
 
     # Uses user input to choose data frame 
+    @prof.instrument()
     def df_selected(event):
         """
         df_selected reacts to user input to the
@@ -139,13 +272,13 @@ def select_data():
         :param event: string representing data frame
         """
         
-        global df
         if event.new == '---':
             return
         elif event.new == 'Saved':
-            df=fs.final_df
+            state.df=fs.get_state().final_df
         elif event.new == 'Original':
-            df=original_df
+            state.df=state.original_df
+        data_changed()
 
     # Data Frame Selector widget
     df_selection = pn.widgets.Select(name='Select table to analyze:', options=true_opts)
@@ -154,7 +287,94 @@ def select_data():
     return df_selection
 
 
-quantitative, qualitative = [], []
+# Recently built plots of every session, keyed by data version
+# and plot selections. Datashaded plots refer to their data frame and
+# its indexes without holding them in their data, so their estimated
+# size is small and the number of plots is capped as well
+plot_cache = cc.LRUCache(max_bytes=256 * 2**20, max_items=32)
+
+# Scatter plots and maps with more rows than this are datashaded
+datashade_threshold = 4000
+
+# Furthest a datashaded point can be from the pointer and still be
+# inspected, as a fraction of the plotted width and height
+inspect_distance = 0.02
+
+# Most rows shown for points selected with the box select tool
+selected_rows = 100
+
+# Maximum number of matches shown by value searches
+value_matches = 20
+
+# Newer panel versions send search text on every keystroke. The pinned
+# bokeh release only sends it on Enter or when the search box loses focus
+if 'value_input' in pn.widgets.TextInput.param:
+    search_event = 'value_input'
+    search_placeholder = 'Type to search'
+else:
+    search_event = 'value'
+    search_placeholder = 'Type and press Enter'
+
+
+def data_changed():
+    """
+    data_changed marks the selected data frame as modified,
+    so plots built from its old contents are not reused.
+    Run this after selecting a new df. Indexes stay with the
+    data frame they were built from.
+    """
+    
+    state = get_state()
+    release_plots(state)
+    state.data_version = next(versions)
+
+
+def find_types():
+    """
+    find_types sorts the columns of the selected data frame
+    into quantitative and qualitative variables.
+    """
+    
+    state = get_state()
+    
+    del state.quantitative[:], state.qualitative[:]
+    
+    # Chunked data sets record the type of each column when stored
+    if isinstance(state.df, ch.ChunkedFrame):
+        for column in state.df.columns:
+            if state.df.kinds[column] == 'qualitative':
+                state.qualitative.append(column)
+            else:
+                state.quantitative.append(column)
+        return
+    
+    for column in state.df.columns:
+        if state.df[column].dtype == 'O':
+            state.qualitative.append(column)
+            continue
+        state.quantitative.append(column)
+
+
+@prof.instrument()
+def get_value_index(column):
+    """
+    get_value_index returns the prefix index of a column
+    in the selected data frame, building it if needed.
+
+    :param column: string representing column name
+    :returns: dictionary produced by Indexes.value_index
+    """
+    
+    data = get_state().df
+
+    def build():
+        if isinstance(data, ch.ChunkedFrame):
+            counts = ch.select(data).value_counts(column)
+            return ix.value_index(counts, counted=True)
+        return ix.value_index(data[column])
+
+    return sn.shared_derived(data, ('value_index', column), build)
+
 
 def explore_data():
     """
@@ -166,30 +386,32 @@ def explore_data():
     :returns: widgets that enable the user to explore data
     """
     
+    state = get_state()
+    
     # Finding quantitative and qualitative variables
-    for column in df.columns:
-        if df[column].dtype == 'O':
-            qualitative.append(column)
-            continue
-        quantitative.append(column)
+    find_types()
     
     # Comparison Selector widget
     comp_operators = ['None', 'less than', 'greater than', 'equal to', 'not equal to']
     comparison_selector = pn.widgets.Select(name='Comparison Operator', options=comp_operators)
     
     # Column Selector widget
-    column_selector = pn.widgets.Select(name='Variable', options=['Entire table']+df.columns.tolist())
+    column_selector = pn.widgets.Select(name='Variable', options=['Entire table']+state.df.columns.tolist())
     
     # Value Selector widget
     value_selector = pn.widgets.Select(name='Value')
     
+    # Value Search widget
+    value_search = pn.widgets.TextInput(name='Search Values', placeholder=search_placeholder)
+    
     # Value Slider widget
     value_slider = pn.widgets.FloatSlider(name='Value')
     
     # Info Selector widget
-    info_select = pn.widgets.Select(name='Variable Statistics (Shown Below)', options=df.columns.tolist())
+    info_select = pn.widgets.Select(name='Variable Statistics (Shown Below)', options=state.df.columns.tolist())
 
     @pn.depends(column_selector.param.value)
+    @prof.instrument()
     def show_values(column):
         """
         show_values displays unique values for variable selected
@@ -206,21 +428,71 @@ def explore_data():
             return pn.Row(value_selector, width=150)
     
         # Displays slider when quantitative variable selected
-        elif column in quantitative:
-            value_slider.start = df[column].min()
-            value_slider.end = df[column].max()
+        elif column in state.quantitative:
+            if isinstance(state.df, ch.ChunkedFrame):
+                stats = ch.select(state.df).moments(column)
+                value_slider.start, value_slider.end = stats[3], stats[4]
+            else:
+                value_slider.start = state.df[column].min()
+                value_slider.end = state.df[column].max()
             comparison_selector.options = comp_operators
             return pn.Row(value_slider, width=150)
     
-        # Displays selector when qualitative values selected
+        # Displays search and selector when qualitative values selected.
+        # Only the most frequent matches are sent to the selector.
         else:
-            options = df[column].unique().tolist()
-            value_selector.options = ['None']+options
+            value_search.value = ''
+            value_selector.options = ix.match_options(get_value_index(column), '', value_matches)
             comparison_selector.options = ['None', 'equal to', 'not equal to']
-            return pn.Row(value_selector, width=150)
+            return pn.Row(pn.Column(value_search, value_selector), width=150)
         
+        
+    @prof.instrument()
+    def search_trigger(event):
+        """
+        search_trigger updates options for value selector
+        after text is typed in the value search widget.
+        
+        :param event: string representing the search text
+        """
+        
+        column = column_selector.value
+        if (column == 'Entire table') or (column in state.quantitative):
+            return
+        value_selector.options = ix.match_options(get_value_index(column), event.new or '', value_matches)
+    
+    value_search.param.watch(search_trigger, [search_event])
 
-    @pn.depends(column_selector.param.value, comparison_selector.param.value, 
+
+    @prof.instrument()
+    def show_filtered(result):
+        """
+        Helper function for display data
+        
+        show_filtered displays the filtered data frame and
+        information table computed by filter_info
+        
+        :param result: tuple of filtered data frame, information table
+                       and number of filtered rows
+        :returns: interactive filtered data frame and info widget
+        """
+        
+        filtered, info, count = result
+        info_widget = pn.Row(info, margin=(-10,0,0,480))
+        if count > len(filtered):
+            note = '##### Showing first {} of {} rows'.format(len(filtered), count)
+            info_widget = pn.Column(info_widget, pn.Row(note, margin=(-10,0,0,480)))
+    
+        # Row slider will not function correctly if data frame is of size 1.
+        if len(filtered) <= 1:
+            return pn.Column(info_widget, view_data(filtered, True, False))
+        else:
+            up_row = pn.Row(view_data(filtered, True, True), margin=(-20,0,0,0))
+
+            return pn.Column(info_widget, up_row)
+
+
+    @sc.depends(column_selector.param.value, comparison_selector.param.value, 
                 value_selector.param.value, value_slider.param.value, info_select.param.value)
     def display_data(col, comp, val_select, val_slide, info_col):
         """
@@ -239,14 +511,9 @@ def explore_data():
             comparison_selector.disabled = True
             value_selector.disabled = True
         
-            # Interactive data frame + slider
-            up_row = pn.Row(view_data(df, True), margin=(-20,0,0,0))
-        
-            # Column info widget
-            info = df[[info_col]].describe().T.reset_index(drop=True)
-            info_widget = pn.Row(info, margin=(-10,0,0,480))
-        
-            return pn.Column(info_widget, up_row)
+            # Column statistics are computed off the event thread
+            return sc.defer(filter_info, show_filtered, col, comp, val_select, 
+                            val_slide, info_col)
     
         # Ensures comparison and value are enabled
         elif comparison_selector.disabled:
@@ -257,55 +524,11 @@ def explore_data():
         if (comp == 'None') or (val_select == 'None'):
             return
     
-        # Filters dataframe and creates information table
-        filtered = filter_data(col, comp, val_select, val_slide)
-        info = filtered[[info_col]].describe().T.reset_index(drop=True)
-        info_widget = pn.Row(info, margin=(-10,0,0,480))
-    
-        # Row slider will not function correctly if data frame is of size 1.
-        if len(filtered) <= 1:
-            return pn.Column(info_widget, view_data(filtered, True, False))
-        else:
-            up_row = pn.Row(view_data(filtered, True, True), margin=(-20,0,0,0))
-
-            return pn.Column(info_widget, up_row)
+        # Filters dataframe and creates information table off the event thread
+        return sc.defer(filter_info, show_filtered, col, comp, val_select, 
+                        val_slide, info_col)
         
         
-    def filter_data(col, comp, val_select, val_slide):
-        """
-        Helper function for display data
-        
-        filter_data filters the displayed data frame based on
-        the user's selected options with the widgets
-        
-        :param col: string representing column in df
-        :param comp: string representing comparison operator
-        :param val_select: string representing value to compare to
-        :param val_slide: integer representing value to compare to
-        :returns: filtered data frame
-        """
-        
-        if col == 'Entire table':
-            return df
-    
-        elif col in quantitative:
-            if comp == 'less than':
-                filtered = df[df[col] < val_slide]
-            elif comp == 'greater than':
-                filtered = df[df[col] > val_slide]
-            elif comp == 'equal to':
-                filtered = df[df[col] == val_slide]
-            else:
-                filtered = df[df[col] != val_slide]
-        
-        else:
-            if comp == 'not equal to':
-                filtered = df[df[col] != val_select]
-            else:
-                filtered = df[df[col] == val_select]
-            
-        return filtered
-
     # Displays widgets produced above
     var_comp = pn.Row(column_selector, comparison_selector, width=300)
     expression = pn.Row(var_comp, show_values, css_classes=['widget-box'])
@@ -316,16 +539,112 @@ def explore_data():
     return widgets
 
 
+@prof.instrument()
+def filter_info(col, comp, val_select, val_slide, info_col):
+    """
+    Helper function for explore_data
+    
+    filter_info filters the data frame and computes the
+    statistics of the info column. Runs in a worker thread.
+    
+    :param col: string representing column in df
+    :param comp: string representing comparison operator
+    :param val_select: string representing value to compare to
+    :param val_slide: integer representing value to compare to
+    :param info_col: string representing info selector selection
+    :returns: tuple of filtered rows, information table
+              and number of filtered rows
+    """
+    
+    filtered = filter_data(col, comp, val_select, val_slide)
+    with prof.section('HoloV.describe', (col, comp, val_select, val_slide, info_col)):
+        if isinstance(filtered, ch.Selection):
+            info = filtered.describe(info_col)
+        else:
+            column = filtered.data[[info_col]]
+            if filtered.rows is not None:
+                column = column.iloc[filtered.rows]
+            info = column.describe().T.reset_index(drop=True)
+    
+    # Only the first page of rows of a chunked data set is loaded
+    count = len(filtered)
+    if isinstance(filtered, ch.Selection):
+        filtered = filtered.page()
+    
+    return filtered, info, count
+
+
+@prof.instrument()
+def filter_data(col, comp, val_select, val_slide):
+    """
+    Helper function for explore_data
+    
+    filter_data filters the displayed data frame based on
+    the user's selected options with the widgets
+    
+    :param col: string representing column in df
+    :param comp: string representing comparison operator
+    :param val_select: string representing value to compare to
+    :param val_slide: integer representing value to compare to
+    :returns: FileScript.Edits keeping the filtered rows,
+              or Selection of a chunked data set
+    """
+    
+    state = get_state()
+    
+    # Chunked data sets are filtered a chunk at a time
+    if isinstance(state.df, ch.ChunkedFrame):
+        if col == 'Entire table':
+            return ch.select(state.df)
+        elif col in state.quantitative:
+            if comp not in ['less than', 'greater than', 'equal to']:
+                comp = 'not equal to'
+            return ch.select(state.df, col, comp, val_slide)
+        elif comp != 'not equal to':
+            comp = 'equal to'
+        return ch.select(state.df, col, comp, val_select)
+    
+    # Rows are kept as positions rather than copied, as the data
+    # frame is shared with other sessions
+    if col == 'Entire table':
+        return fr.Edits(state.df)
+
+    elif col in state.quantitative:
+        if comp == 'less than':
+            mask = state.df[col] < val_slide
+        elif comp == 'greater than':
+            mask = state.df[col] > val_slide
+        elif comp == 'equal to':
+            mask = state.df[col] == val_slide
+        else:
+            mask = state.df[col] != val_slide
+    
+    else:
+        if comp == 'not equal to':
+            mask = state.df[col] != val_select
+        else:
+            mask = state.df[col] == val_select
+        
+    return fr.Edits(state.df, rows=np.flatnonzero(mask.values))
+
+
 def visualize():
     
+    state = get_state()
+    
+    # Plots need every value in memory
+    if isinstance(state.df, ch.ChunkedFrame):
+        return pn.pane.Markdown('##### Chunked data sets can be explored but not visualized.')
+    
+    # Loads plotting libraries, in the notebook cell when used there
+    load_plotting()
+    
     # Finds columns with only unique values - too many options!
     unique = find_unique()
 
     # Detects latitude and longitude columns and
-    # creates data frame containing these coordinates.
-    coord_out = detect_coords()
-    coordinates = coord_out[0]
-    has_coords = coord_out[1]
+    # projects these coordinates for maps.
+    has_coords = detect_coords()[1]
         
     # Defining available plot types – for user
     uni = ['histogram', 'boxplot']
@@ -339,13 +658,13 @@ def visualize():
     p_selector = pn.widgets.Select(name='1. Plot Type', options=multi+uni+group+maps)
     
     # X Variable Selector widget
-    x_selector = pn.widgets.Select(name='2. X Variable', options=quantitative)
+    x_selector = pn.widgets.Select(name='2. X Variable', options=state.quantitative)
     
     # Y Variable Selector widget
-    y_selector = pn.widgets.Select(name='3. Y Variable', options=quantitative)
+    y_selector = pn.widgets.Select(name='3. Y Variable', options=state.quantitative)
     
     # Identifier Selector widget
-    identifier = pn.widgets.Select(name='Identifier', options=qualitative)
+    identifier = pn.widgets.Select(name='Identifier', options=state.qualitative)
     
     # Size Selector widget
     size = pn.widgets.FloatSlider(name='Size', start=3, value=6, end=12)
@@ -356,6 +675,13 @@ def visualize():
     # Subgroup Selector widget
     sg_selector = pn.widgets.Select(name='Subgroup', options=['None'])
     
+    # Subgroup Search widget
+    sg_search = pn.widgets.TextInput(name='Search Subgroups', placeholder=search_placeholder)
+    
+    # Subgroup Display Selector widget
+    d_selector = pn.widgets.RadioButtonGroup(options=['Subgroup', 'Overlay', 'Small Multiples'], 
+                                             value='Subgroup', width=230)
+    
     # Dummy Selector widget
     dummy = pn.widgets.Select(name='Dummy')
 
@@ -382,12 +708,13 @@ def visualize():
         identifier.disabled = i
         g_selector.disabled = g
         sg_selector.disabled = sg
+        d_selector.disabled = g
     
     
-    @pn.depends(p_selector.param.value, x_selector.param.value, y_selector.param.value,
+    @sc.depends(p_selector.param.value, x_selector.param.value, y_selector.param.value,
                 identifier.param.value, size.param.value, g_selector.param.value, 
-                sg_selector.param.value)
-    def plotter(p_selector, x, y, identifier, size, group_col, sg_value):
+                sg_selector.param.value, d_selector.param.value)
+    def plotter(p_selector, x, y, identifier, size, group_col, sg_value, display):
         """
         plotter creates plots based on the selected values for the selectors
         defined above. The kind of plot is determined by the p_selector and
@@ -400,12 +727,17 @@ def visualize():
         :param size: string representing the size of plot values
         :param group_col: string representing the group by column
         :param sg_value: string representing the subgroup column
+        :param display: string representing how subgroups are shown
         :returns: hvplot
         """
     
         # Defining available plot types – for hvplot()
         multi = ['scatter']
         uni = ['histogram', 'boxplot']
+        
+        ident = None
+        if len(state.qualitative) > 0:
+            ident = identifier
     
         # Case for scatterplot, all wdigets except Groupby and Subgroup enabled
         if (x == y) and not (p_selector in uni+group+maps):
@@ -416,60 +748,47 @@ def visualize():
         elif p_selector in multi:
             disabler(False, False, False, False, True, True)
             
-            ident = []
-            if len(qualitative) > 0:
-                ident = [identifier]
-        
-            # Scatter plots with more than 4000 points significantly increase lag in plot
-            # interactivity. HoloViz's datashade made to alleviate these situations.
-            if len(df) > 4000:
-                plot = df.hvplot(x, y, hover_cols=ident, datashade=True,
-                             hover_color='red', kind=p_selector).opts(frame_height=300)
-                
-            else:
-                plot = df.hvplot(x, y, hover_cols=ident, hover_color='red', 
-                                 kind=p_selector).opts(frame_height=300, size=size)
+            # Datashaded scatter plots ignore the size selector
+            if len(state.df) > datashade_threshold:
+                size = None
+            key = (state.data_version, p_selector, x, y, ident, size, None, None, None)
     
         # Univariate plots
         elif p_selector in uni:
             disabler(False, True, True, True, True, True)
-            
-            # Determining univariate plot selection
-            choice = [i for i in ['hist', 'box'] if p_selector.startswith(i)][0]
-            horizontal = False
-        
-            if choice == 'box':
-                horizontal = True
-            
-            plot = df.hvplot(y=x, hover_color='red', kind=choice, invert=horizontal).opts(frame_height=300)
+            key = (state.data_version, p_selector, x, None, None, None, None, None, None)
     
         # Density/groupby plot
         elif p_selector in group:
             disabler(False, True, True, True, False, False)
-        
-            # Filter data frame to group restrictions
-            if (group_col != 'None') & (sg_value != 'None'):   
-                filtered_df = df[df[group_col] == sg_value]
-                plot = filtered_df.hvplot(y=x, kind='kde').opts(frame_height=300)
-                
-            else:
-                plot = df.hvplot(y=x, kind='kde').opts(frame_height=300)
+            
+            # Overlays and small multiples show every subgroup
+            if group_col == 'None':
+                display = None
+            elif display != 'Subgroup':
+                sg_value = None
+            key = (state.data_version, p_selector, x, None, None, None, group_col, sg_value, display)
 
         # Map plot
         elif p_selector in maps:
             disabler(True, True, False, False, True, True)
             
-            ident = []
-            if len(qualitative) > 0:
-                ident = [identifier]
-                
-            plot = OSM() * coordinates.hvplot.points(x='easting', y='northing',
-                                                     hover_cols=ident, size=size)
+            # Datashaded maps ignore the size selector
+            if len(state.df) > datashade_threshold:
+                size = None
+            key = (state.data_version, p_selector, None, None, ident, size, None, None, None)
+        
+        # Reuses plot if it was recently built with the same selections,
+        # otherwise builds it off the event thread
+        plot = plot_cache.get(key)
+        if plot is None:
+            return sc.defer(build_plot, partial(cache_plot, key), *key[1:])
         
         return plot
 
 
     # Produces options for 'Subgroup' after selecting groupby
+    @prof.instrument()
     def group_trigger(event):
         """
         group_trigger updates options for subgroup selector
@@ -481,19 +800,39 @@ def visualize():
         if g_selector.value == 'None':
             sg_selector.value == 'None'
             sg_selector.disabled = True
+            sg_search.disabled = True
             return
         sg_selector.disabled = False
-        sg_selector.options = ['None'] + df[g_selector.value].dropna().unique().tolist()
+        sg_search.disabled = False
+        sg_search.value = ''
+        sg_selector.options = ix.match_options(get_value_index(g_selector.value), '', value_matches)
     
     g_selector.param.watch(group_trigger, ['value'])
 
 
+    # Narrows 'Subgroup' options to values matching search
+    @prof.instrument()
+    def sg_search_trigger(event):
+        """
+        sg_search_trigger updates options for subgroup selector
+        after text is typed in the subgroup search widget.
+        
+        :param event: string representing the search text
+        """
+        
+        if g_selector.value == 'None':
+            return
+        sg_selector.options = ix.match_options(get_value_index(g_selector.value), event.new or '', value_matches)
+    
+    sg_search.param.watch(sg_search_trigger, [search_event])
+
+
     # Displays widgets produced above
     selectors2 = pn.Row(p_selector, x_selector, y_selector)
     scatter_options = pn.Column(identifier, size, margin=(40,0,0,0), 
                                 width=250, css_classes=['widget-box'])
 
-    group_options = pn.Column(g_selector, sg_selector, margin=(20,0,0,0), 
+    group_options = pn.Column(g_selector, sg_search, sg_selector, d_selector, margin=(20,0,0,0), 
                               width=250, css_classes=['widget-box'])
 
     toolbar = pn.Column(scatter_options, group_options, margin=(0,10,0,0))
@@ -503,6 +842,208 @@ def visualize():
     return widgets
 
 
+def cache_plot(key, plot):
+    """
+    Helper function for visualize
+    
+    cache_plot stores a built plot in plot_cache, unless the data
+    changed while it was being built.
+    
+    :param key: tuple of data version and plot selections
+    :param plot: plot built for key
+    :returns: plot
+    """
+    
+    if key[0] == get_state().data_version:
+        plot_cache.put(key, plot)
+    
+    return plot
+
+
+@prof.instrument()
+def build_plot(kind, x, y, ident, size, group_col, sg_value, display):
+    """
+    Helper function for visualize
+    
+    build_plot constructs a plot of the selected data frame.
+    Selections a plot type does not use are passed as None.
+    
+    :param kind: string representing type of plot to produce
+    :param x: string representing the x value
+    :param y: string representing the y value
+    :param ident: string representing identifier to use
+    :param size: float representing the size of plot values
+    :param group_col: string representing the group by column
+    :param sg_value: string representing the subgroup column
+    :param display: string representing how subgroups are shown
+    :returns: hvplot
+    """
+    
+    state = get_state()
+    
+    load_plotting()
+    hover = [] if ident is None else [ident]
+    
+    if kind == 'scatter':
+        # Scatter plots with more than 4000 points significantly increase lag in plot
+        # interactivity. HoloViz's datashade made to alleviate these situations.
+        if len(state.df) > datashade_threshold:
+            plot = state.df.hvplot(x, y, hover_cols=hover, datashade=True,
+                             hover_color='red', kind=kind).opts(frame_height=300)
+            plot = inspect_plot(plot, state.df[x].values, state.df[y].values, x, y, hover)
+            
+        else:
+            plot = state.df.hvplot(x, y, hover_cols=hover, hover_color='red', 
+                             kind=kind).opts(frame_height=300, size=size)
+    
+    # Plots are drawn from binned counts or quantiles rather
+    # than every value in the column
+    elif kind == 'histogram':
+        plot = histogram_plot(state.df[x].values, x)
+        
+    elif kind == 'boxplot':
+        plot = boxplot_plot(state.df[x].values, x)
+    
+    elif kind == 'density':
+        # Subgroup curves come from one pass over the group column
+        if (group_col != 'None') and (display != 'Subgroup'):
+            plot = grouped_density_plot(x, group_col, display)
+            
+        elif (group_col != 'None') and (sg_value in get_grouped_density(x, group_col)[2]):
+            grid, densities, labels = get_grouped_density(x, group_col)
+            plot = hv.Area((grid, densities[labels.index(sg_value)]), kdims=[x], 
+                           vdims=['Density']).opts(frame_height=300, fill_alpha=0.5)
+            
+        else:
+            plot = density_plot(state.df[x].values, x)
+    
+    elif kind == 'map':
+        # Only the projected coordinates and identifier are plotted
+        coordinates = dict(detect_coords()[0])
+        for col in hover:
+            coordinates[col] = state.df[col].values
+        points = pd.DataFrame(coordinates)
+        
+        # Maps are datashaded past the same threshold as scatter plots
+        if len(state.df) > datashade_threshold:
+            plot = OSM() * points.hvplot.points(x='easting', y='northing', 
+                                                datashade=True)
+            plot = inspect_plot(plot, points['easting'].values, points['northing'].values,
+                                'easting', 'northing', hover)
+        else:
+            plot = OSM() * points.hvplot.points(x='easting', y='northing',
+                                                hover_cols=hover, size=size)
+    
+    return plot
+
+
+def inspect_plot(plot, xs, ys, x_name, y_name, hover):
+    """
+    Helper function for build_plot
+    
+    inspect_plot restores hover and click inspection on datashaded
+    plots, which only send an image to the browser. The point nearest
+    the pointer is looked up in a spatial index on the server and
+    drawn with its identifier, and clicking shows the nearest row
+    of the data frame in a table below the plot. Points inside a
+    box drawn with the box select tool are listed in a second table.
+    
+    :param plot: datashaded plot
+    :param xs: array of plotted x values
+    :param ys: array of plotted y values
+    :param x_name: string representing x axis name
+    :param y_name: string representing y axis name
+    :param hover: list of identifier columns
+    :returns: holoviews layout of plot and row tables
+    """
+    
+    data = get_state().df
+    index = sn.shared_derived(data, ('spatial_index', x_name, y_name), 
+                              partial(ix.spatial_index, xs, ys))
+    
+    def nearest_row(x, y):
+        if (x is None) or (y is None):
+            return []
+        position = ix.nearest(index, x, y, max_distance=inspect_distance)
+        return [] if position is None else [position]
+    
+    def hovered(x, y):
+        rows = nearest_row(x, y)
+        points = {x_name: xs[rows], y_name: ys[rows]}
+        for col in hover:
+            points[col] = data[col].values[rows]
+        return hv.Points(points, kdims=[x_name, y_name], vdims=hover)
+    
+    def clicked(x, y):
+        return hv.Table(data.iloc[nearest_row(x, y)])
+    
+    def boxed(bounds):
+        if bounds is None:
+            return hv.Table(data.iloc[[]])
+        x_min, y_min, x_max, y_max = bounds
+        rows = ix.within(index, x_min, x_max, y_min, y_max)
+        label = '{} points selected'.format(len(rows))
+        if len(rows) > selected_rows:
+            label += ', showing first {}'.format(selected_rows)
+        return hv.Table(data.iloc[rows[:selected_rows]], label=label)
+    
+    marker = hv.DynamicMap(hovered, streams=[hv.streams.PointerXY(source=plot)])
+    marker = marker.opts(tools=['hover', 'box_select'], color='red', size=10)
+    table = hv.DynamicMap(clicked, streams=[hv.streams.Tap(source=plot)])
+    selection = hv.DynamicMap(boxed, streams=[hv.streams.BoundsXY(source=plot)])
+    
+    return (plot * marker + table.opts(height=100) + selection.opts(height=200)).cols(1)
+
+
+@prof.instrument()
+def get_grouped_density(x, group_col):
+    """
+    Helper function for build_plot
+    
+    get_grouped_density returns the density curves of a column
+    for every value of a group column, computing all of them in
+    one pass the first time they are needed.
+    
+    :param x: string representing column name
+    :param group_col: string representing the group by column
+    :returns: tuple of shared grid, densities and group labels
+    """
+    
+    data = get_state().df
+    
+    def build():
+        codes, labels = pd.factorize(data[group_col])
+        grid, densities, counts = ag.grouped_kde(data[x].values, codes, len(labels))
+        return grid, densities, list(labels)
+        
+    return sn.shared_derived(data, ('grouped_density', x, group_col), build)
+
+
+def grouped_density_plot(x, group_col, display):
+    """
+    Helper function for build_plot
+    
+    grouped_density_plot draws the density curves of every
+    subgroup, either overlaid or as small multiples
+    
+    :param x: string representing column name
+    :param group_col: string representing the group by column
+    :param display: string representing how subgroups are shown
+    :returns: holoviews overlay or layout
+    """
+    
+    grid, densities, labels = get_grouped_density(x, group_col)
+    curves = [hv.Area((grid, density), kdims=[x], vdims=['Density'], label=str(label))
+              for label, density in zip(labels, densities)]
+    
+    if display == 'Overlay':
+        return hv.Overlay(curves).opts(
+            opts.Area(fill_alpha=0.3), opts.Overlay(frame_height=300, legend_position='right'))
+    
+    return hv.Layout(curves).opts(
+        opts.Area(fill_alpha=0.5, frame_height=120, frame_width=180)).cols(3)
+
+
 def find_unique():
     """
     Helper function for visualize
@@ -515,9 +1056,11 @@ def find_unique():
     :returns: list of variables with many unique values
     """
     
+    state = get_state()
+    
     unique = []
-    for col in qualitative:
-        col_data = df[col].dropna()
+    for col in state.qualitative:
+        col_data = state.df[col].dropna()
         size = len(col_data)
         n_unique = col_data.nunique()
         
@@ -530,18 +1073,36 @@ def find_unique():
     return unique
 
 
+@prof.instrument()
 def detect_coords():
     """
     Helper function for visualize
     
     detect_coords detects latitude and longitude columns
-    and creates new data frame containing these coordinates
+    and projects these coordinates to web mercator. The
+    projection is computed once per data frame.
     
-    :returns: data frame containing coordinates if coordinates exist
+    :returns: dictionary of easting/northing arrays and whether coordinates exist
     """
+    
+    data = get_state().df
+    return sn.shared_derived(data, 'projection', partial(project_coords, data))
+
+
+def project_coords(data):
+    """
+    Helper function for detect_coords
+    
+    project_coords projects the latitude and longitude columns
+    of a data frame to web mercator.
+    
+    :param data: data frame
+    :returns: dictionary of easting/northing arrays and whether coordinates exist
+    """
+    
     lat, lon = [],[] 
 
-    for col in df.columns:
+    for col in data.columns:
         if '#number#hidden' in col:
             if 'lon' in col:
                 lon.append(col)
@@ -553,10 +1114,81 @@ def detect_coords():
             lon.append(col)
 
     if len(lat) > 0 and len(lon) > 0:
-        x, y = datashader.geo.lnglat_to_meters(df[lon[0]], df[lat[0]])
-        coordinates = df.join([pd.DataFrame({'easting': x}), 
-                               pd.DataFrame({'northing': y})])
-        
-        return coordinates, True
+        from datashader.geo import lnglat_to_meters
+        x, y = lnglat_to_meters(data[lon[0]].values.astype(float), 
+                                data[lat[0]].values.astype(float))
+        return {'easting': x, 'northing': y}, True
     
     return None, False
+
+
+def histogram_plot(values, name):
+    """
+    Helper function for visualize
+    
+    histogram_plot draws a histogram from binned counts
+    computed on the server
+    
+    :param values: array of column values
+    :param name: string representing column name
+    :returns: holoviews histogram
+    """
+    
+    edges, counts = ag.histogram(values)
+    
+    return hv.Histogram((edges, counts), kdims=[name], vdims=['Count']).opts(
+        frame_height=300, tools=['hover'], hover_color='red')
+
+
+def boxplot_plot(values, name):
+    """
+    Helper function for visualize
+    
+    boxplot_plot draws a horizontal boxplot from the quartiles, 
+    whiskers and outliers computed on the server
+    
+    :param values: array of column values
+    :param name: string representing column name
+    :returns: holoviews overlay of box, whiskers and outliers
+    """
+    
+    stats = ag.box_summary(values)
+    if stats is None:
+        return hv.Points([], kdims=[name, ' ']).opts(frame_height=300)
+    
+    q1, median, q3 = stats['q1'], stats['median'], stats['q3']
+    lower, upper = stats['lower'], stats['upper']
+    
+    box = hv.Polygons([[(q1, -0.25), (q3, -0.25), (q3, 0.25), (q1, 0.25)]], 
+                      kdims=[name, ' '])
+    lines = hv.Path([[(lower, 0), (q1, 0)], [(q3, 0), (upper, 0)],
+                     [(lower, -0.1), (lower, 0.1)], [(upper, -0.1), (upper, 0.1)],
+                     [(median, -0.25), (median, 0.25)]], kdims=[name, ' '])
+    outliers = hv.Points((stats['outliers'], [0]*len(stats['outliers'])), 
+                         kdims=[name, ' '])
+    
+    plot = (box * lines * outliers).opts(
+        opts.Polygons(fill_color='#30a2da', line_color='black'),
+        opts.Path(color='black'),
+        opts.Points(color='black', size=4),
+        opts.Overlay(frame_height=300, yaxis=None))
+    
+    return plot
+
+
+def density_plot(values, name):
+    """
+    Helper function for visualize
+    
+    density_plot draws a kernel density estimate computed on
+    a fixed size grid on the server
+    
+    :param values: array of column values
+    :param name: string representing column name
+    :returns: holoviews area
+    """
+    
+    grid, density = ag.kde(values)
+    
+    return hv.Area((grid, density), kdims=[name], vdims=['Density']).opts(
+        frame_height=300, fill_alpha=0.5)
@@ -0,0 +1,281 @@
+""" Data Indexes
+
+This script builds lookup structures over the columns of a data
+frame so that widgets can query them on the server instead of
+shipping every value to the browser.
+
+To achieve this functionality, build an index once with
+value_index() and query it as often as needed with search_values().
+
+This script requires that numpy and pandas be installed within
+the Python environment you are running this script on.
+"""
+
+
+# Importing libraries
+import numpy as np
+
+
+def value_index(series, counted=False):
+    """
+    value_index builds a prefix index over the unique values of
+    a column. Values are sorted by their lowercase text so that
+    every value starting with a given prefix sits in one
+    contiguous slice of the index.
+
+    :param series: pandas series to index
+    :param counted: bool indicating series holds counts indexed by value
+    :returns: dictionary of sorted keys, values and frequency counts
+    """
+
+    counts = series if counted else series.dropna().value_counts(sort=False)
+    keys = np.array([str(value).lower() for value in counts.index])
+    order = np.argsort(keys, kind='mergesort')
+
+    return {'keys': keys[order],
+            'values': counts.index.values[order],
+            'counts': counts.values[order]}
+
+
+def search_values(index, query, k=20):
+    """
+    search_values finds the most frequent values of an index
+    that start with the given text. Matching is case insensitive.
+
+    :param index: dictionary produced by value_index
+    :param query: string representing text typed by the user
+    :param k: integer representing maximum number of matches
+    :returns: list of (value, count) tuples, most frequent first
+    """
+
+    # Locates slice of keys starting with query
+    query = str(query).lower()
+    keys = index['keys']
+    lower = np.searchsorted(keys, query, side='left')
+    upper = np.searchsorted(keys, query + '\U0010ffff', side='left')
+
+    if upper <= lower:
+        return []
+
+    # Keeps only the k most frequent values in the slice
+    counts = index['counts'][lower:upper]
+    if len(counts) > k:
+        top = np.argpartition(-counts, k-1)[:k]
+    else:
+        top = np.arange(len(counts))
+    top = top[np.lexsort((top, -counts[top]))]
+
+    values = index['values'][lower:upper]
+    return [(values[i], int(counts[i])) for i in top]
+
+
+def match_options(index, query, k=20):
+    """
+    match_options formats the matches of search_values as
+    options for a selector widget, labelling each value
+    with its frequency.
+
+    :param index: dictionary produced by value_index
+    :param query: string representing text typed by the user
+    :param k: integer representing maximum number of matches
+    :returns: dictionary mapping labels to values
+    """
+
+    options = {'None': 'None'}
+    for value, count in search_values(index, query, k):
+        options['{} ({})'.format(value, count)] = value
+
+    return options
+
+
+def spatial_index(x, y, per_cell=4):
+    """
+    spatial_index builds a uniform grid over a set of points.
+    Points are sorted by the grid cell they fall in, so the
+    points of any cell, or of any run of cells in a grid row,
+    sit in one contiguous slice of the index.
+
+    :param x: array-like of x coordinates
+    :param y: array-like of y coordinates
+    :param per_cell: integer representing average points per cell
+    :returns: dictionary holding the grid and sorted points
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    rows = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    x, y = x[rows], y[rows]
+
+    if len(rows) == 0:
+        return {'rows': rows, 'x': x, 'y': y, 'starts': np.zeros(2, dtype=int),
+                'bounds': (0., 1., 0., 1.), 'shape': (1, 1)}
+
+    # Grid of roughly square cell counts, padded so that
+    # constant coordinates still have a non-zero extent
+    x_min, x_max = x.min(), x.max()
+    y_min, y_max = y.min(), y.max()
+    x_max = x_max if x_max > x_min else x_min + 1.
+    y_max = y_max if y_max > y_min else y_min + 1.
+    n_side = max(1, int(np.sqrt(len(rows) / per_cell)))
+
+    cells = grid_cells(x, y, (x_min, x_max, y_min, y_max), (n_side, n_side))
+    order = np.argsort(cells, kind='mergesort')
+    starts = np.searchsorted(cells[order], np.arange(n_side * n_side + 1))
+
+    return {'rows': rows[order], 'x': x[order], 'y': y[order], 'starts': starts,
+            'bounds': (x_min, x_max, y_min, y_max), 'shape': (n_side, n_side)}
+
+
+def grid_cells(x, y, bounds, shape):
+    """
+    Helper function for spatial_index
+
+    grid_cells finds the column, row and flat number of the
+    grid cell containing each point. Points outside the grid
+    are assigned to the nearest edge cell.
+
+    :param x: numpy array of x coordinates
+    :param y: numpy array of y coordinates
+    :param bounds: tuple of x min, x max, y min and y max
+    :param shape: tuple of number of cells along x and y
+    :returns: numpy array of flat cell numbers
+    """
+
+    columns, rows = grid_position(x, y, bounds, shape)
+    return rows * shape[0] + columns
+
+
+def grid_position(x, y, bounds, shape):
+    """
+    Helper function for spatial_index
+
+    grid_position finds the column and row of the grid cell
+    containing each point, clamped to the grid.
+
+    :param x: number or numpy array of x coordinates
+    :param y: number or numpy array of y coordinates
+    :param bounds: tuple of x min, x max, y min and y max
+    :param shape: tuple of number of cells along x and y
+    :returns: tuple of cell columns and cell rows
+    """
+
+    x_min, x_max, y_min, y_max = bounds
+    n_x, n_y = shape
+
+    columns = np.clip(np.floor((x - x_min) / (x_max - x_min) * n_x), 0, n_x - 1)
+    rows = np.clip(np.floor((y - y_min) / (y_max - y_min) * n_y), 0, n_y - 1)
+
+    return columns.astype(int), rows.astype(int)
+
+
+def nearest(index, x, y, max_distance=None):
+    """
+    nearest finds the indexed point closest to a location.
+    Distances are measured as fractions of the width and
+    height of the indexed points, so axes with very different
+    units are weighed equally.
+
+    Grid cells are searched in rings around the location until
+    no cell left unsearched can hold a closer point.
+
+    :param index: dictionary produced by spatial_index
+    :param x: float representing x coordinate of location
+    :param y: float representing y coordinate of location
+    :param max_distance: float representing furthest match allowed
+    :returns: integer position of nearest point, None if no match
+    """
+
+    if len(index['rows']) == 0:
+        return None
+
+    x_min, x_max, y_min, y_max = index['bounds']
+    n_x, n_y = index['shape']
+    width, height = x_max - x_min, y_max - y_min
+    column, row = grid_position(x, y, index['bounds'], index['shape'])
+
+    # Location in units of cells
+    cell_x = (x - x_min) / width * n_x
+    cell_y = (y - y_min) / height * n_y
+
+    best, best_distance = None, np.inf
+    for ring in range(max(n_x, n_y)):
+        # Collects points of cells on the ring, one slice per grid row
+        candidates = []
+        for cell_row in range(row - ring, row + ring + 1):
+            if not 0 <= cell_row < n_y:
+                continue
+            if abs(cell_row - row) == ring:
+                spans = [(column - ring, column + ring)]
+            else:
+                spans = [(column - ring, column - ring), (column + ring, column + ring)]
+            for first, last in spans:
+                first, last = max(first, 0), min(last, n_x - 1)
+                if first > last:
+                    continue
+                start = index['starts'][cell_row * n_x + first]
+                stop = index['starts'][cell_row * n_x + last + 1]
+                if stop > start:
+                    candidates.append(np.arange(start, stop))
+
+        if candidates:
+            candidates = np.concatenate(candidates)
+            distance = np.hypot((index['x'][candidates] - x) / width,
+                                (index['y'][candidates] - y) / height)
+            closest = distance.argmin()
+            if distance[closest] < best_distance:
+                best, best_distance = candidates[closest], distance[closest]
+
+        # Distance to the nearest cell not searched yet, which lies
+        # in the strips of the grid left, right, below or above the ring
+        strips = []
+        if column - ring > 0:
+            strips.append((0, column - ring, 0, n_y))
+        if column + ring < n_x - 1:
+            strips.append((column + ring + 1, n_x, 0, n_y))
+        if row - ring > 0:
+            strips.append((0, n_x, 0, row - ring))
+        if row + ring < n_y - 1:
+            strips.append((0, n_x, row + ring + 1, n_y))
+
+        unsearched = min([np.hypot(max(left - cell_x, 0, cell_x - right) / n_x,
+                                   max(bottom - cell_y, 0, cell_y - top) / n_y)
+                          for left, right, bottom, top in strips] + [np.inf])
+        if (best_distance <= unsearched) or (max_distance is not None and 
+                                              unsearched > max_distance):
+            break
+
+    if best is None or (max_distance is not None and best_distance > max_distance):
+        return None
+
+    return int(index['rows'][best])
+
+
+def within(index, x_min, x_max, y_min, y_max):
+    """
+    within finds the indexed points inside a box.
+
+    :param index: dictionary produced by spatial_index
+    :param x_min: float representing left edge of box
+    :param x_max: float representing right edge of box
+    :param y_min: float representing bottom edge of box
+    :param y_max: float representing top edge of box
+    :returns: numpy array of positions of points in the box
+    """
+
+    if len(index['rows']) == 0:
+        return np.array([], dtype=int)
+
+    n_x, n_y = index['shape']
+    first, low = grid_position(x_min, y_min, index['bounds'], index['shape'])
+    last, high = grid_position(x_max, y_max, index['bounds'], index['shape'])
+
+    # Cells of one grid row between two columns are contiguous
+    slices = [np.arange(index['starts'][row * n_x + first],
+                        index['starts'][row * n_x + last + 1])
+              for row in range(low, high + 1)]
+    candidates = np.concatenate(slices)
+
+    x, y = index['x'][candidates], index['y'][candidates]
+    inside = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+
+    return np.sort(index['rows'][candidates[inside]])
@@ -0,0 +1,290 @@
+""" Callback Profiler
+
+This script records where time goes when the notebook's widgets
+are used. Widget callbacks and the main data operations are
+wrapped with counters of calls, wall time and memory change,
+and calls repeated with the same arguments shortly after each
+other are counted as redundant re-triggers. The counters can be
+watched in a live dashboard and exported as a profile file.
+
+Profiling is off until enable() is run, and wrapped functions
+then cost only a flag check.
+
+To achieve this functionality, run enable() and display
+dashboard() in the notebook.
+
+This script requires that pandas and panel be installed within
+the Python environment you are running this script on.
+"""
+
+
+# Importing libraries
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+
+# Whether calls are being recorded
+enabled = False
+
+# Whether memory changes are being recorded
+trace_memory = False
+
+# Seconds within which a call with unchanged arguments is redundant
+redundant_window = 2.0
+
+# Counters by function name
+counters = {}
+
+# Arguments and time of the last call by function name
+last_calls = {}
+
+# Guards counters against updates from worker threads
+lock = threading.Lock()
+
+
+def enable(memory=True):
+    """
+    enable starts recording calls.
+
+    :param memory: bool indicating whether to record memory changes,
+                   which slows down the profiled code
+    """
+
+    global enabled
+    global trace_memory
+    enabled = True
+    trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    disable stops recording calls. Counters are kept.
+    """
+
+    global enabled
+    enabled = False
+    if trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    """
+    reset clears every counter.
+    """
+
+    with lock:
+        counters.clear()
+        last_calls.clear()
+
+
+def instrument(name=None):
+    """
+    instrument wraps a function so its calls are recorded
+    while profiling is enabled.
+
+    :param name: string representing counter name, module.function if None
+    :returns: decorator
+    """
+
+    def decorator(func):
+        label = name or '{}.{}'.format(func.__module__, func.__name__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+
+            with section(label, signature(args, kwargs)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def section(name, arguments=None):
+    """
+    section records a block of code under a counter name
+    while profiling is enabled.
+
+    :param name: string representing counter name
+    :param arguments: hashable summary of the block's inputs, used
+                      to detect redundant re-triggers
+    """
+
+    if not enabled:
+        yield
+        return
+
+    memory = trace_memory and tracemalloc.is_tracing()
+    before = tracemalloc.get_traced_memory()[0] if memory else 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        delta = tracemalloc.get_traced_memory()[0] - before if memory else 0
+        record(name, seconds, delta, arguments, start)
+
+
+def record(name, seconds, delta, arguments, start):
+    """
+    Helper function
+
+    record adds a call to a counter.
+
+    :param name: string representing counter name
+    :param seconds: float representing wall time of the call
+    :param delta: integer representing change in traced memory
+    :param arguments: hashable summary of the call's inputs, None if unknown
+    :param start: float representing when the call started
+    """
+
+    with lock:
+        counter = counters.setdefault(name, {'calls': 0, 'seconds': 0., 'max_seconds': 0.,
+                                             'memory_delta': 0, 'redundant': 0})
+        counter['calls'] += 1
+        counter['seconds'] += seconds
+        counter['max_seconds'] = max(counter['max_seconds'], seconds)
+        counter['memory_delta'] += delta
+
+        if arguments is not None:
+            previous = last_calls.get(name)
+            if (previous is not None) and (previous[0] == arguments) and \
+               (start - previous[1] < redundant_window):
+                counter['redundant'] += 1
+            last_calls[name] = (arguments, start)
+
+
+def signature(args, kwargs):
+    """
+    Helper function
+
+    signature summarises call arguments cheaply. Simple values
+    and tuples of them are kept, and other objects such as data
+    frames are identified by type and id.
+
+    :param args: tuple of positional arguments
+    :param kwargs: dictionary of keyword arguments
+    :returns: tuple summarising the arguments
+    """
+
+    def summary(value):
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        # Widget events are tuples of the widget and its old and new values
+        if isinstance(value, tuple):
+            return tuple(summary(item) for item in value)
+        return (type(value).__name__, id(value))
+
+    return (tuple(summary(arg) for arg in args) +
+            tuple((key, summary(value)) for key, value in sorted(kwargs.items())))
+
+
+def report():
+    """
+    report tabulates the counters, slowest in total first.
+
+    :returns: data frame with one row per counter
+    """
+
+    with lock:
+        rows = [dict(counter, name=name) for name, counter in counters.items()]
+
+    columns = ['name', 'calls', 'total_s', 'mean_ms', 'max_ms', 'memory_mb', 'redundant']
+    if len(rows) == 0:
+        return pd.DataFrame(columns=columns)
+
+    table = pd.DataFrame(rows)
+    table['total_s'] = table['seconds'].round(4)
+    table['mean_ms'] = (1000 * table['seconds'] / table['calls']).round(2)
+    table['max_ms'] = (1000 * table['max_seconds']).round(2)
+    table['memory_mb'] = (table['memory_delta'] / 2**20).round(2)
+
+    return table[columns].sort_values('total_s', ascending=False).reset_index(drop=True)
+
+
+def export(path):
+    """
+    export saves the counters as a JSON profile file.
+
+    :param path: string representing file path
+    """
+
+    with lock:
+        profile = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'memory_traced': trace_memory,
+                   'counters': {name: dict(counter) for name, counter in counters.items()}}
+
+    with open(path, 'w') as file:
+        json.dump(profile, file, indent=2)
+
+
+def dashboard(period=1000):
+    """
+    dashboard displays the counters in a table that refreshes
+    itself, with buttons to record, reset and export them.
+
+    :param period: integer representing milliseconds between refreshes
+    :returns: dashboard widgets
+    """
+
+    # Imported here so that profiled scripts can be used without panel
+    import panel as pn
+
+    # Recording Toggle widget
+    recorder = pn.widgets.Toggle(name='Record', value=enabled, width=120)
+
+    # Reset Button widget
+    resetter = pn.widgets.Button(name='Reset', width=120)
+
+    # Export Path widget
+    export_path = pn.widgets.TextInput(value='profile.json', width=200)
+
+    # Export Button widget
+    exporter = pn.widgets.Button(name='Export', button_type='primary', width=120)
+
+    # Panel 0.6 has no DataFrame pane, so the table is shown as html
+    table = pn.pane.HTML(report().to_html(), width=700)
+    status = pn.pane.Markdown('')
+
+    def refresh():
+        table.object = report().to_html()
+
+    def record_trigger(event):
+        if event.new:
+            enable()
+        else:
+            disable()
+
+    def reset_trigger(event):
+        reset()
+        refresh()
+
+    def export_trigger(event):
+        export(export_path.value)
+        status.object = 'Profile saved to ' + export_path.value
+
+    recorder.param.watch(record_trigger, ['value'])
+    resetter.on_click(reset_trigger)
+    exporter.on_click(export_trigger)
+
+    controls = pn.Row(recorder, resetter, export_path, exporter, css_classes=['widget-box'])
+    widgets = pn.Column('### Callback Profile', controls, status, table)
+
+    # Newer panel versions schedule periodic callbacks on pn.state
+    if hasattr(pn.state, 'add_periodic_callback'):
+        pn.state.add_periodic_callback(refresh, period=period)
+    else:
+        widgets.add_periodic_callback(refresh, period=period)
+
+    return widgets
@@ -0,0 +1,380 @@
+""" Callback Scheduler
+
+This script schedules the callbacks that redraw displays when
+widgets change. Bursts of widget events, such as those sent
+while a slider is dragged, are coalesced into a single call
+made once the widgets have settled, and results computed from
+superseded widget values are discarded so only the latest
+state is ever displayed. Heavy work can be moved off the
+event thread to a pool of worker threads, with a loading
+message shown until its result is applied back on the event
+thread.
+
+To achieve this functionality, decorate a function with
+depends() in place of pn.depends() and display the returned
+panel. The function may return defer() to run work in the pool.
+
+This script requires that panel, bokeh and tornado be installed
+within the Python environment you are running this script on.
+"""
+
+
+# Importing libraries
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import panel as pn
+from bokeh.io import curdoc
+from tornado.ioloop import IOLoop
+
+# Importing other scripts
+import Profiler as prof
+import Sessions as sn
+
+# Loading extensions, once for every script using widgets
+pn.extension()
+
+
+# Seconds widget values must stay unchanged before a callback runs
+default_wait = 0.15
+
+# Number of worker threads running deferred work
+workers = 4
+
+# Shown while deferred work is running
+loading_message = '##### Loading...'
+
+# Worker pool, created on first use
+executor = None
+
+
+def set_workers(count):
+    """
+    set_workers changes the number of worker threads. Work
+    already submitted finishes on the previous pool.
+
+    :param count: integer representing number of threads
+    """
+
+    global workers
+    global executor
+    workers = count
+    if executor is not None:
+        executor.shutdown(wait=False)
+        executor = None
+
+
+def get_executor():
+    """
+    Helper function
+
+    get_executor returns the worker pool, creating it if needed.
+
+    :returns: thread pool executor
+    """
+
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    return executor
+
+
+class Deferred(object):
+    """
+    Deferred describes work to run in the worker pool. The
+    work must not change widgets; its result is passed to
+    finish, which runs on the event thread and returns what
+    is displayed. If the work raises an error, the error is
+    passed to failed instead.
+
+    :param work: function to run in the pool
+    :param finish: function applied to the result, None to display it as is
+    :param args: arguments for work
+    :param message: string shown while work runs, loading_message if None
+    :param failed: function applied to the error, None to display the error
+    """
+
+    def __init__(self, work, finish, args, message=None, failed=None):
+        self.work = work
+        self.finish = finish
+        self.args = args
+        self.message = message
+        self.failed = failed
+
+
+def defer(work, finish=None, *args, message=None, failed=None):
+    """
+    defer returns work for a depends() function to run in the
+    worker pool instead of on the event thread.
+
+    :param work: function to run in the pool
+    :param finish: function applied to the result on the event thread
+    :param args: arguments for work
+    :param message: string shown while work runs, loading_message if None
+    :param failed: function applied to an error raised by work on the
+                   event thread, for example to re-enable widgets
+    :returns: Deferred
+    """
+
+    return Deferred(work, finish, args, message, failed)
+
+
+def depends(*parameters, **kwargs):
+    """
+    depends is used like pn.depends to link a function to
+    widget parameters, but debounces the function's calls.
+
+    :param parameters: widget parameters the function depends on
+    :param wait: float representing seconds to wait, default_wait if None
+    :returns: decorator producing a panel that displays the function's result
+    """
+
+    wait = kwargs.get('wait')
+
+    def decorator(func):
+        return Debounced(func, parameters, wait).panel
+
+    return decorator
+
+
+class Debounced(object):
+    """
+    Debounced calls a function with the current values of its
+    widget parameters once they have stopped changing, and
+    displays the result in a panel.
+
+    Events raised by the function itself, for example when it
+    resets a button, are handled immediately as they would be
+    with pn.depends.
+
+    If the function returns a Deferred, its work is submitted to
+    the worker pool, for the same session, and a loading message
+    is displayed. Queued
+    work is cancelled and finished work is discarded once newer
+    widget values arrive.
+
+    Calls are recorded by the Profiler while it is enabled.
+
+    :param func: function to call with the parameter values
+    :param parameters: widget parameters the function depends on
+    :param wait: float representing seconds to wait, default_wait if None
+    """
+
+    def __init__(self, func, parameters, wait=None):
+        self.func = prof.instrument()(func)
+        self.parameters = parameters
+        self.wait = wait
+        self.generation = 0
+        self.cancel = None
+        self.running = False
+        self.future = None
+
+        self.panel = pn.Column(margin=0)
+        self.panel.append(pn.Spacer(width=0, height=0))
+        self.display(self.call(), self.generation)
+        for parameter in parameters:
+            parameter.owner.param.watch(self.trigger, [parameter.name])
+
+    def values(self):
+        """
+        values reads the current value of every parameter.
+
+        :returns: list of parameter values
+        """
+
+        return [getattr(parameter.owner, parameter.name) for parameter in self.parameters]
+
+    def call(self):
+        """
+        call runs the function with the current parameter values.
+
+        :returns: function result
+        """
+
+        self.running = True
+        try:
+            return self.func(*self.values())
+        finally:
+            self.running = False
+
+    def trigger(self, *events):
+        """
+        trigger reacts to a parameter change by restarting the
+        wait before the function is called. Results of calls
+        already scheduled or running become stale.
+
+        :param events: param events
+        """
+
+        # Changes made by the function itself are applied in place
+        if self.running:
+            self.display(self.func(*self.values()), self.generation)
+            return
+
+        self.generation += 1
+        if self.cancel is not None:
+            self.cancel()
+        wait = default_wait if self.wait is None else self.wait
+        self.cancel = call_later(wait, partial(self.run, self.generation))
+
+    def run(self, generation):
+        """
+        run calls the function if no newer event has arrived
+        since it was scheduled, and displays the result unless
+        it was superseded while being computed.
+
+        :param generation: integer representing event the call answers
+        """
+
+        self.cancel = None
+        if generation != self.generation:
+            return
+
+        result = self.call()
+        if generation == self.generation:
+            self.display(result, generation)
+
+    def display(self, result, generation):
+        """
+        display shows a result, or submits deferred work to the
+        worker pool and shows a loading message until it is done.
+
+        :param result: function result
+        :param generation: integer representing event the result answers
+        """
+
+        if not isinstance(result, Deferred):
+            self.panel[0] = render(result)
+            return
+
+        # Newer work replaces work still waiting for a thread
+        if self.future is not None:
+            self.future.cancel()
+
+        message = loading_message if result.message is None else result.message
+        self.panel[0] = pn.pane.Markdown(message)
+
+        # Work runs for the session that requested it
+        dispatch = ui_dispatcher()
+        key = sn.session_key()
+        self.future = get_executor().submit(sn.in_session, key, result.work, *result.args)
+        self.future.add_done_callback(lambda future: dispatch(
+            partial(sn.in_session, key, self.finish, result, future, generation)))
+
+    def finish(self, deferred, future, generation):
+        """
+        finish runs on the event thread once deferred work is
+        done and displays its result if it is still current.
+
+        :param deferred: Deferred that was submitted
+        :param future: future holding the work's result
+        :param generation: integer representing event the work answers
+        """
+
+        if self.future is future:
+            self.future = None
+        if future.cancelled() or (generation != self.generation):
+            return
+
+        error = future.exception()
+        if error is not None:
+            if deferred.failed is not None:
+                self.panel[0] = render(deferred.failed(error))
+            else:
+                self.panel[0] = error_message(error)
+            return
+
+        result = future.result()
+        if deferred.finish is not None:
+            result = deferred.finish(result)
+        self.panel[0] = render(result)
+
+
+def error_message(error):
+    """
+    Helper function
+
+    error_message describes an error raised by deferred work.
+
+    :param error: exception raised by the work
+    :returns: markdown pane
+    """
+
+    return pn.pane.Markdown('**Error:** ' + str(error))
+
+
+def render(result):
+    """
+    Helper function
+
+    render converts a callback result into an object that
+    can be placed in a panel.
+
+    :param result: callback result
+    :returns: result, or an empty spacer if result is None
+    """
+
+    if result is None:
+        return pn.Spacer(width=0, height=0)
+
+    return result
+
+
+def call_later(wait, callback):
+    """
+    Helper function
+
+    call_later schedules a callback on the event loop of the
+    current Bokeh server session, or of the notebook kernel.
+
+    :param wait: float representing seconds to wait
+    :param callback: function to call with no arguments
+    :returns: function that cancels the callback
+    """
+
+    doc = curdoc()
+    if doc.session_context is not None:
+        handle = doc.add_timeout_callback(callback, int(wait * 1000))
+        return partial(doc.remove_timeout_callback, handle)
+
+    loop = IOLoop.current()
+    handle = loop.call_later(wait, callback)
+    return partial(loop.remove_timeout, handle)
+
+
+def ui_dispatcher():
+    """
+    Helper function
+
+    ui_dispatcher captures the event loop of the current Bokeh
+    server session, or of the notebook kernel. Must be called
+    on the event thread.
+
+    :returns: thread safe function that runs a callback on the event thread
+    """
+
+    doc = curdoc()
+    if doc.session_context is not None:
+        return doc.add_next_tick_callback
+
+    return IOLoop.current().add_callback
+
+
+def on_ui_thread(func):
+    """
+    on_ui_thread wraps a function that changes widgets so that
+    it can be called from worker threads. Must be called on the
+    event thread.
+
+    :param func: function to run on the event thread
+    :returns: function that schedules func with the given arguments
+    """
+
+    dispatch = ui_dispatcher()
+    key = sn.session_key()
+
+    def wrapper(*args):
+        dispatch(partial(sn.in_session, key, func, *args))
+
+    return wrapper
@@ -0,0 +1,298 @@
+""" Session State
+
+This script keeps the state of the notebook's scripts apart for
+every user when the app is served to several users at once with
+panel serve. Each Bokeh server session gets its own state, and
+the notebook uses a single default state. Data sets loaded from
+files are shared read-only between sessions, as are indexes and
+other values computed from a data set, so that every session
+holds only its own selections and edits rather than a copy of
+the data.
+
+To achieve this functionality, a script calls session_module()
+with the names and starting values of its state, and reads and
+writes them through get_state(). The names also remain
+available as attributes of the script, for example ho.df.
+
+This script requires that bokeh be installed within the Python
+environment you are running this script on.
+"""
+
+
+# Importing libraries
+import os
+import sys
+import threading
+import types
+import weakref
+from contextlib import contextmanager
+from functools import partial
+
+from bokeh.io import curdoc
+
+
+# Key of the state used outside Bokeh server sessions, as in the notebook
+default_session = 'notebook'
+
+# State of every session, by session key and script name
+states = {}
+
+# Weak references to data sets shared by every session, by source
+datasets = {}
+
+# Values computed from data sets, shared by every session using
+# the same data set, by data set id and value name
+derived = {}
+
+# Starting values of every script's state, by script name
+defaults = {}
+
+# Names of every script's state, by script name
+fields = {}
+
+# Functions releasing a script's state when its session closes, by script name
+closers = {}
+
+# Guards states and datasets against sessions and worker threads
+lock = threading.RLock()
+
+# Session bound to the current thread while it runs deferred work
+local = threading.local()
+
+
+class State(object):
+    """
+    State holds the values of one script for one session.
+
+    :param values: dictionary of starting values
+    """
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+class SessionModule(types.ModuleType):
+    """
+    SessionModule is the type given to scripts by session_module
+    so that their state names read and write the current session's
+    state when used as attributes of the script.
+    """
+
+    def __getattr__(self, name):
+        if name in fields.get(self.__name__, ()):
+            return getattr(get_state(self.__name__), name)
+        raise AttributeError("module '{}' has no attribute '{}'".format(self.__name__, name))
+
+    def __setattr__(self, name, value):
+        if name in fields.get(self.__name__, ()):
+            setattr(get_state(self.__name__), name, value)
+        else:
+            super().__setattr__(name, value)
+
+
+def session_module(name, values, close=None):
+    """
+    session_module makes the names of a script's state refer to
+    the state of the current session.
+
+    :param name: string representing script name, __name__ of the script
+    :param values: function returning a dictionary of starting values
+    :param close: function called with the script's state when its
+                  session closes, None if nothing needs releasing
+    """
+
+    defaults[name] = values
+    fields[name] = set(values())
+    if close is not None:
+        closers[name] = close
+    sys.modules[name].__class__ = SessionModule
+
+
+def session_key():
+    """
+    session_key identifies the session the current thread is
+    working for.
+
+    :returns: string representing session key
+    """
+
+    key = getattr(local, 'key', None)
+    if key is not None:
+        return key
+
+    doc = curdoc()
+    if doc.session_context is not None:
+        return doc.session_context.id
+
+    return default_session
+
+
+def get_state(name):
+    """
+    get_state returns a script's state for the current session,
+    creating it from the script's starting values if needed.
+
+    :param name: string representing script name
+    :returns: State
+    """
+
+    key = session_key()
+    with lock:
+        if key not in states:
+            states[key] = {}
+            watch_session(key)
+        session = states[key]
+        if name not in session:
+            session[name] = State(defaults[name]())
+
+        return session[name]
+
+
+def watch_session(key):
+    """
+    Helper function for get_state
+
+    watch_session discards a Bokeh server session's state once
+    the session is closed.
+
+    :param key: string representing session key
+    """
+
+    doc = curdoc()
+    if (doc.session_context is not None) and (doc.session_context.id == key):
+        doc.on_session_destroyed(lambda context: discard(key))
+
+
+def discard(key):
+    """
+    discard removes the state of a session, letting each script
+    release what it kept for the session.
+
+    :param key: string representing session key
+    """
+
+    with lock:
+        session = states.pop(key, {})
+
+    for name, state in session.items():
+        if name in closers:
+            closers[name](state)
+
+
+@contextmanager
+def bind(key):
+    """
+    bind makes the current thread work for a session, so that
+    work run in worker threads reads the state of the session
+    that requested it.
+
+    :param key: string representing session key
+    """
+
+    previous = getattr(local, 'key', None)
+    local.key = key
+    try:
+        yield
+    finally:
+        local.key = previous
+
+
+def in_session(key, func, *args):
+    """
+    in_session calls a function while bound to a session.
+
+    :param key: string representing session key
+    :param func: function to call
+    :param args: arguments for func
+    :returns: function result
+    """
+
+    with bind(key):
+        return func(*args)
+
+
+def shared_dataset(path, loader):
+    """
+    shared_dataset loads a file once for every session. The file
+    is loaded again if it changed on disk. Only a weak reference
+    is kept, so the data set is released once no session refers
+    to it. Sessions must not modify the data set returned.
+
+    :param path: string representing file or directory path
+    :param loader: function loading path, returning None if it cannot
+    :returns: data set returned by loader
+    """
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    source = (loader, path)
+    version = (stat.st_mtime, stat.st_size)
+
+    with lock:
+        if (source in datasets) and (datasets[source][0] == version):
+            data = datasets[source][1]()
+            if data is not None:
+                return data
+
+        data = loader(path)
+        if data is not None:
+            datasets[source] = version, weakref.ref(data, partial(release_dataset, source))
+
+        return data
+
+
+def release_dataset(source, reference):
+    """
+    Helper function for shared_dataset
+
+    release_dataset forgets a data set no session refers to,
+    unless it was loaded again since.
+
+    :param source: tuple of the loader and path of the data set
+    :param reference: weak reference to the released data set
+    """
+
+    with lock:
+        if (source in datasets) and (datasets[source][1] is reference):
+            del datasets[source]
+
+
+def shared_derived(data, name, build):
+    """
+    shared_derived computes a value from a data set once for
+    every session using that data set, such as an index or a
+    projection. The value is discarded along with the data set.
+    Sessions must not modify the data set or the value.
+
+    :param data: data set the value is computed from
+    :param name: hashable naming the value
+    :param build: function computing the value with no arguments
+    :returns: value returned by build
+    """
+
+    key = id(data)
+    with lock:
+        if key not in derived:
+            derived[key] = {}
+            weakref.finalize(data, derived.pop, key, None)
+        values = derived[key]
+        if name in values:
+            return values[name]
+
+    # Built outside the lock so sessions do not wait on each other
+    value = build()
+    with lock:
+        return values.setdefault(name, value)
+
+
+def discard_derived(data):
+    """
+    discard_derived forgets every value computed from a data set
+    by shared_derived, so that they are computed again when next
+    used.
+
+    :param data: data set the values were computed from
+    """
+
+    with lock:
+        derived.get(id(data), {}).clear()